@@ -0,0 +1,245 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from binaries import get_binary
+from cache import user_cache_dir
+from converter import ENCODERS, PRESETS
+from decode import PROFILE_NAMES
+
+CLI_PATH = str(Path(__file__).resolve().parent / "video_to_gif_cli.py")
+
+# name -> (lavfi source, size, rate, duration); testsrc2 is in constant motion, smptehdbars is static
+SOURCES = {
+    "720p30-10s": ("testsrc2", "1280x720", 30, 10),
+    "1080p30-30s": ("testsrc2", "1920x1080", 30, 30),
+    "1080p30-10min": ("testsrc2", "1920x1080", 30, 600),
+    "static-1080p30-30s": ("smptehdbars", "1920x1080", 30, 30),
+}
+DEFAULT_SOURCES = ["1080p30-30s"]
+DEFAULT_FPS = [10, 24]
+DEFAULT_TRIMS = ["full", "3"]
+DEFAULT_MODES = ["single-pass", "two-pass"]
+DEFAULT_FRAME_DIFF = ["on"]
+DEFAULT_PROFILES = [PROFILE_NAMES[0]]
+DEFAULT_ADAPTIVE_FPS = ["off"]
+DEFAULT_SEGMENT_TRIM = ["on"]
+DEFAULT_ENCODERS = [ENCODERS[0]]
+# Metrics compared against the baseline, lower is better
+COMPARED_METRICS = ("wall_time", "cpu_time", "max_rss_kb", "output_bytes")
+
+def generate_source(name):
+    """Create (or reuse) a synthetic test video"""
+    lavfi_source, size, rate, duration = SOURCES[name]
+    path = user_cache_dir("bench") / f"{name}.mp4"
+    if not path.exists():
+        tmp_path = path.with_suffix(".part.mp4")
+        cmd = [
+            get_binary("ffmpeg"), '-v', 'error', '-f', 'lavfi',
+            '-i', f'{lavfi_source}=size={size}:rate={rate}:duration={duration}',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-g', str(rate * 10), '-y', str(tmp_path)
+        ]
+        subprocess.run(cmd, check=True, capture_output=True)
+        os.replace(tmp_path, path)
+    return str(path), duration
+
+def run_measured(cmd):
+    """Run a command, returning wall time, child CPU time and peak RSS"""
+    # stderr goes to a file: a pipe read only after the wait would block a chatty run once full
+    with tempfile.TemporaryFile() as stderr_file:
+        started = time.perf_counter()
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr_file)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            cpu_time = usage.ru_utime + usage.ru_stime
+            max_rss = usage.ru_maxrss
+        else:
+            process.wait()
+            cpu_time = max_rss = None
+        wall_time = time.perf_counter() - started
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace")
+    if process.returncode != 0:
+        raise RuntimeError(stderr.strip() or f"exit code {process.returncode}")
+    return wall_time, cpu_time, max_rss
+
+def grid(args):
+    """Yield every benchmark case"""
+    presets = [(w, h) for _, w, h in PRESETS]
+    if args.presets:
+        presets = [tuple(p.split("x")) for p in args.presets]
+    return itertools.product(args.sources, presets, args.fps, (False, True), args.trims, args.modes,
+                             args.frame_diff, args.profiles, args.adaptive_fps, args.segment_trim, args.encoders)
+
+def count_frames(gif_path):
+    """Frames in a GIF, or None if ffprobe cannot tell"""
+    cmd = [get_binary("ffprobe"), '-v', 'error', '-count_frames', '-select_streams', 'v:0',
+           '-show_entries', 'stream=nb_read_frames', '-of', 'csv=p=0', gif_path]
+    try:
+        return int(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.strip())
+    except (subprocess.CalledProcessError, ValueError):
+        return None
+
+def run_case(source, duration, preset, fps, crop, trim, mode, frame_diff, profile, adaptive_fps, segment_trim,
+             encoder, out_dir):
+    """Convert once with the given settings and measure it"""
+    width, height = preset
+    output = os.path.join(out_dir, "out.gif")
+    cmd = [
+        sys.executable, CLI_PATH, source, '-o', output, '-j', '1', '--no-palette-cache', '--no-result-cache',
+        '--width', width, '--height', height, '--fps', str(fps), '--mode', mode, '--profile', profile,
+        '--encoder', encoder
+    ]
+    if crop:
+        cmd += ['--crop', '640:360:100:100']
+    if frame_diff == "off":
+        cmd.append('--no-frame-diff')
+    if adaptive_fps == "on":
+        cmd.append('--adaptive-fps')
+    if segment_trim == "off":
+        cmd.append('--no-segment-trim')
+    if trim != "full":
+        # Take the trimmed clip from deep into the source
+        start = max(duration - float(trim) - 1, 0)
+        cmd += ['--start', str(start), '--stop', str(start + float(trim))]
+    wall_time, cpu_time, max_rss = run_measured(cmd)
+    return {
+        "wall_time": round(wall_time, 3),
+        "cpu_time": round(cpu_time, 3) if cpu_time is not None else None,
+        "max_rss_kb": max_rss,
+        "output_bytes": os.path.getsize(output),
+        "output_frames": count_frames(output),
+    }
+
+def run_fanout(source, presets, fps, mode, out_dir):
+    """Time one fan-out run writing every preset against one conversion per preset"""
+    base = [sys.executable, CLI_PATH, source, '-j', '1', '--no-palette-cache', '--no-result-cache',
+            '--fps', str(fps), '--mode', mode]
+    separate_time = separate_cpu = 0.0
+    for width, height in presets:
+        wall_time, cpu_time, _ = run_measured(base + ['-o', os.path.join(out_dir, "out.gif"),
+                                                      '--width', width, '--height', height])
+        separate_time += wall_time
+        separate_cpu += cpu_time or 0.0
+    variants = [arg for width, height in presets for arg in ('--variant', f'{width}x{height}')]
+    fanout_time, fanout_cpu, max_rss = run_measured(base + ['-o', os.path.join(out_dir, "fanout.gif")] + variants)
+    return {
+        "separate_time": round(separate_time, 3),
+        "fanout_time": round(fanout_time, 3),
+        "speedup": round(separate_time / fanout_time, 2),
+        "separate_cpu_time": round(separate_cpu, 3) if fanout_cpu is not None else None,
+        "fanout_cpu_time": round(fanout_cpu, 3) if fanout_cpu is not None else None,
+        "fanout_max_rss_kb": max_rss,
+    }
+
+def compare(results, baseline, threshold):
+    """Report cases that got worse than the baseline by more than threshold"""
+    previous = {case_id(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get(case_id(result))
+        if not old:
+            continue
+        for metric in COMPARED_METRICS:
+            new_value, old_value = result.get(metric), old.get(metric)
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if change > threshold:
+                regressions.append(f"{case_id(result)} {metric}: {old_value} -> {new_value} (+{change:.0%})")
+    return regressions
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def case_id(result):
+    # Results from before these were configurable ran with the defaults
+    result = {"frame_diff": "on", "profile": PROFILE_NAMES[0], "adaptive_fps": "off", "segment_trim": "on",
+              "encoder": ENCODERS[0], **result}
+    return ("{source} {width}x{height} fps={fps} crop={crop} trim={trim} mode={mode} diff={frame_diff} "
+            "profile={profile} adaptive={adaptive_fps} segment={segment_trim} encoder={encoder}").format(**result)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the video to GIF pipeline")
+    parser.add_argument("--sources", nargs="+", default=DEFAULT_SOURCES, choices=sorted(SOURCES))
+    parser.add_argument("--presets", nargs="+", metavar="WxH", help="default: the GUI presets")
+    parser.add_argument("--fps", nargs="+", type=int, default=DEFAULT_FPS)
+    parser.add_argument("--trims", nargs="+", default=DEFAULT_TRIMS, help="'full' or clip length in seconds")
+    parser.add_argument("--modes", nargs="+", default=DEFAULT_MODES, choices=["auto", "single-pass", "two-pass"])
+    parser.add_argument("--profiles", nargs="+", default=DEFAULT_PROFILES, choices=PROFILE_NAMES)
+    parser.add_argument("--frame-diff", nargs="+", default=DEFAULT_FRAME_DIFF, choices=["on", "off"])
+    parser.add_argument("--adaptive-fps", nargs="+", default=DEFAULT_ADAPTIVE_FPS, choices=["on", "off"])
+    parser.add_argument("--segment-trim", nargs="+", default=DEFAULT_SEGMENT_TRIM, choices=["on", "off"])
+    parser.add_argument("--encoders", nargs="+", default=DEFAULT_ENCODERS, choices=ENCODERS)
+    parser.add_argument("--fanout", action="store_true",
+                        help="compare one multi-variant run over all presets with one conversion per preset "
+                             "instead of running the case grid")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="results file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    sources = {name: generate_source(name) for name in args.sources}
+    if args.fanout:
+        return fanout_main(args, sources)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="gif_bench_") as out_dir:
+        for (name, preset, fps, crop, trim, mode, frame_diff, profile, adaptive_fps, segment_trim,
+             encoder) in grid(args):
+            source, duration = sources[name]
+            result = {"source": name, "width": preset[0], "height": preset[1], "fps": fps,
+                      "crop": crop, "trim": trim, "mode": mode, "frame_diff": frame_diff, "profile": profile,
+                      "adaptive_fps": adaptive_fps, "segment_trim": segment_trim, "encoder": encoder}
+            try:
+                result.update(run_case(source, duration, preset, fps, crop, trim, mode, frame_diff, profile,
+                                       adaptive_fps, segment_trim, encoder, out_dir))
+            except RuntimeError as e:
+                result["error"] = str(e)
+            results.append(result)
+            print(case_id(result),
+                  {k: result.get(k) for k in COMPARED_METRICS + ("output_frames", "error") if k in result})
+
+    report = {"environment": environment(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+def fanout_main(args, sources):
+    """Print the fan-out speedup for every source, fps and mode"""
+    presets = [tuple(p.split("x")) for p in args.presets] if args.presets else [(w, h) for _, w, h in PRESETS]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="gif_bench_") as out_dir:
+        for name, fps, mode in itertools.product(args.sources, args.fps, args.modes):
+            result = {"source": name, "variants": len(presets), "fps": fps, "mode": mode}
+            try:
+                result.update(run_fanout(sources[name][0], presets, fps, mode, out_dir))
+            except RuntimeError as e:
+                result["error"] = str(e)
+            results.append(result)
+            print(result)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "fanout": results}, f, indent=2)
+    return 1 if any("error" in result for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import hashlib
+import importlib.util
+import json
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from cache import user_cache_dir
+
+RESOURCE_DIR = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent)) / "resources"
+MANIFEST_FILE = "manifest.json"
+EXE_SUFFIX = ".exe" if os.name == "nt" else ""
+
+# name -> (file name on disk, attribute in the legacy script_data module)
+BINARIES = {
+    "ffmpeg": ("ffmpeg" + EXE_SUFFIX, "FFMPEG_BIN"),
+    "ffprobe": ("ffprobe" + EXE_SUFFIX, "FFPROBE_BIN"),
+    "icon": ("icon.ico", "ICON_BIN"),
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+_resolved = {}
+_lock = threading.Lock()
+
+def get_binary(name):
+    """Return a path to the named tool, extracting it on first use"""
+    with _lock:
+        if name not in _resolved:
+            _resolved[name] = _resolve(name)
+        return _resolved[name]
+
+def _resolve(name):
+    """Prefer a tool from PATH, otherwise use the bundled copy"""
+    filename, _ = BINARIES[name]
+    if name != "icon":
+        system_path = shutil.which(filename)
+        if system_path:
+            return system_path
+    return str(_extract(name))
+
+def _load_manifest():
+    """Read the resource manifest written by pack_resources"""
+    try:
+        with open(RESOURCE_DIR / MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _extract(name):
+    """Extract a bundled payload into the per-user cache keyed by its hash"""
+    filename, attr = BINARIES[name]
+    entry = _load_manifest().get(name)
+    if entry:
+        target = user_cache_dir("bin", entry["sha256"]) / filename
+        if not target.exists():
+            with lzma.open(RESOURCE_DIR / entry["file"], "rb") as src:
+                _write_atomic(src, target, entry["sha256"])
+        return target
+
+    # Older builds embed the payloads in script_data.py, a ~200 MB module; keying the cache on
+    # its size and mtime lets a warm start find the extracted copy without importing it
+    key = _script_data_key()
+    if key:
+        target = user_cache_dir("bin", key) / filename
+        if target.exists():
+            return target
+    import script_data
+    payload = getattr(script_data, attr)
+    if not key:
+        target = user_cache_dir("bin", hashlib.sha256(payload).hexdigest()) / filename
+        if target.exists():
+            return target
+    _write_payload(payload, target)
+    return target
+
+def _script_data_key():
+    """Cache key from script_data.py's size and mtime, or None when it is not a file on disk"""
+    try:
+        stat = os.stat(importlib.util.find_spec("script_data").origin)
+    except (AttributeError, TypeError, ValueError, OSError):
+        return None
+    return f"script_data-{stat.st_size}-{stat.st_mtime_ns}"
+
+def _write_payload(payload, target):
+    """Write an in-memory payload to target through a temporary file"""
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            dst.write(payload)
+        os.chmod(tmp_path, 0o755)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def _write_atomic(src, target, expected_digest):
+    """Stream src into target, verifying the hash before publishing it"""
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                dst.write(chunk)
+        if digest.hexdigest() != expected_digest:
+            raise RuntimeError(f"Corrupted bundled resource: {target.name}")
+        os.chmod(tmp_path, 0o755)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def pack_resources():
+    """Convert script_data.py payloads into compressed resource files"""
+    import script_data
+    RESOURCE_DIR.mkdir(exist_ok=True)
+    manifest = {}
+    for name, (filename, attr) in BINARIES.items():
+        payload = getattr(script_data, attr)
+        resource_name = filename + ".xz"
+        with lzma.open(RESOURCE_DIR / resource_name, "wb", preset=6) as dst:
+            dst.write(payload)
+        manifest[name] = {
+            "file": resource_name,
+            "sha256": hashlib.sha256(payload).hexdigest(),
+        }
+    with open(RESOURCE_DIR / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+if __name__ == "__main__":
+    pack_resources()
@@ -0,0 +1,20 @@
+import os
+import sys
+from pathlib import Path
+
+APP_NAME = "video_to_gif"
+
+def user_cache_dir(*parts):
+    """Return the per-user cache directory, creating it if needed"""
+    base = os.environ.get("VIDEO_TO_GIF_CACHE_DIR")
+    if not base:
+        if os.name == "nt":
+            base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+            base = Path(base) / APP_NAME
+        elif sys.platform == "darwin":
+            base = Path.home() / "Library" / "Caches" / APP_NAME
+        else:
+            base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / APP_NAME
+    path = Path(base).joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import replace
+
+from binaries import get_binary
+from cache import user_cache_dir
+from converter import ProgressEvent, convert, get_clip_duration
+from gif_join import join_gifs
+from metadata import source_identity
+from palette import DEFAULT_SAMPLES_PER_CLIP, build_shared_palette
+from supervisor import kill_process
+from workspace import Workspace, atomic_output
+
+SCENE_DIR = "scenes"
+# ffmpeg scene score above which a frame starts a new scene
+SCENE_THRESHOLD = 0.3
+# Frames are scored at this width; scene changes survive heavy downscaling
+SCENE_SCAN_WIDTH = 160
+# Chunks shorter than this are not worth an extra ffmpeg process
+MIN_CHUNK_SECONDS = 5
+# A scene cut within this fraction of a chunk length from an even split is used instead
+SCENE_SNAP = 0.25
+# Shared palette samples taken per chunk
+SAMPLES_PER_CHUNK = 6
+
+_lock = threading.Lock()
+
+def _scene_cache_path(video_path, start, stop, threshold):
+    payload = json.dumps([source_identity(video_path), start, stop, threshold])
+    return user_cache_dir(SCENE_DIR) / f"{hashlib.sha256(payload.encode()).hexdigest()}.json"
+
+def detect_scenes(video_path, start, stop, threshold=SCENE_THRESHOLD):
+    """Source timestamps of scene cuts inside [start, stop], cached on disk per source and range"""
+    path = _scene_cache_path(video_path, start, stop, threshold)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    cmd = [get_binary("ffmpeg"), '-hide_banner', '-ss', str(start), '-to', str(stop),
+           '-i', video_path, '-map', '0:v:0',
+           '-vf', f"scale={SCENE_SCAN_WIDTH}:-2,select='gt(scene,{threshold})',showinfo",
+           '-f', 'null', '-']
+    result = subprocess.run(cmd, capture_output=True, text=True, errors='replace', check=True)
+    # showinfo timestamps restart at zero after input seeking
+    cuts = [start + float(t) for t in re.findall(r'showinfo.*?pts_time:\s*([\d.]+)', result.stderr)]
+
+    with _lock:
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cuts, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    return cuts
+
+def chunk_count(duration, chunks=None):
+    """Number of chunks for a clip, defaulting to one per CPU"""
+    chunks = chunks or os.cpu_count() or 1
+    return max(1, min(chunks, int(duration // MIN_CHUNK_SECONDS)))
+
+def split_points(start, stop, count, cuts, fps):
+    """Chunk boundaries from start to stop, snapped to nearby scene cuts and the output frame grid"""
+    length = (stop - start) / count
+    points = [start]
+    for i in range(1, count):
+        ideal = start + length * i
+        nearby = [cut for cut in cuts if abs(cut - ideal) <= length * SCENE_SNAP]
+        point = min(nearby, key=lambda cut: abs(cut - ideal)) if nearby else ideal
+        # On the fps grid no frame is duplicated or dropped at the seam
+        point = start + round((point - start) * fps) / fps
+        if points[-1] < point < stop:
+            points.append(point)
+    return points + [stop]
+
+def convert_chunked(settings, input_video, output_gif, chunks=None, scene_threshold=SCENE_THRESHOLD,
+                    on_status=None, on_progress=None, on_process=None):
+    """Convert a clip as parallel chunks sharing one palette, joined into a single GIF
+
+    Chunks are split at scene cuts where possible so seams fall on a change of
+    picture. Clips too short to split are converted normally.
+    """
+    duration = get_clip_duration(settings, input_video)
+    if not duration:
+        raise ValueError("Cannot determine the clip duration")
+    count = chunk_count(duration, chunks)
+    if count < 2:
+        return convert(settings, input_video, output_gif, on_status, on_progress, on_process)
+
+    start = settings.start_time or 0
+    stop = start + duration
+    cuts = []
+    if scene_threshold:
+        if on_status:
+            on_status("Detecting scenes...")
+        cuts = detect_scenes(input_video, start, stop, scene_threshold)
+    bounds = split_points(start, stop, count, cuts, settings.fps)
+
+    palette = settings.palette or build_shared_palette(
+        settings, [input_video], max(DEFAULT_SAMPLES_PER_CLIP, SAMPLES_PER_CHUNK * count), on_status
+    )
+    # Share the cores between the chunks instead of each decoder starting a thread per core
+    threads = settings.threads or max(1, (os.cpu_count() or 1) // (len(bounds) - 1))
+    chunk_settings = [
+        replace(settings, start_time=a, stop_time=b, palette=palette, cache_palette=False, cache_result=False,
+                threads=threads)
+        for a, b in zip(bounds, bounds[1:])
+    ]
+    workspace = Workspace("chunks_")
+    parts = [workspace.file(f"chunk_{index}.gif") for index in range(len(chunk_settings))]
+
+    # Seconds done per chunk, summed into one event for the whole clip
+    done = [0.0] * len(parts)
+    progress_lock = threading.Lock()
+
+    def report(index, event):
+        with progress_lock:
+            done[index] = bounds[index + 1] - bounds[index] if event.done else event.out_time
+            total = sum(done)
+        if on_progress:
+            on_progress(ProgressEvent("Creating GIF...", out_time=total, duration=duration,
+                                      speed=event.speed and event.speed * len(parts)))
+
+    # Every chunk's ffmpeg, so a cancel or a failed chunk stops all of them rather than the latest one
+    processes = []
+    stopped = False
+
+    def track(process):
+        with progress_lock:
+            processes.append(process)
+            if stopped:
+                kill_process(process)
+        if on_process:
+            on_process(process)
+
+    def stop_chunks():
+        nonlocal stopped
+        with progress_lock:
+            stopped = True
+            running = list(processes)
+        for process in running:
+            kill_process(process)
+
+    if on_status:
+        on_status(f"Creating GIF in {len(parts)} chunks...")
+    try:
+        with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+            futures = [
+                pool.submit(convert, chunk, input_video, part, None,
+                            lambda event, index=index: report(index, event), track)
+                for index, (chunk, part) in enumerate(zip(chunk_settings, parts))
+            ]
+            try:
+                finished, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                failures = [future.exception() for future in finished if future.exception()]
+                if failures:
+                    raise failures[0]
+            except BaseException:
+                stop_chunks()
+                for future in futures:
+                    future.cancel()
+                raise
+        if on_status:
+            on_status("Joining chunks...")
+        with atomic_output(output_gif) as partial_gif:
+            join_gifs(parts, partial_gif)
+    finally:
+        workspace.cleanup()
+    if on_progress:
+        on_progress(ProgressEvent("Creating GIF...", duration=duration, done=True))
+    return output_gif
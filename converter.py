@@ -0,0 +1,649 @@
+import os
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass, replace
+from math import ceil
+
+from binaries import get_binary
+from decode import DEFAULT_SCALER, PROFILE_NAMES, DecodeTuning, decode_tuning
+from instrumentation import StageMetrics, log_stage, wait_measured
+from metadata import get_store
+from palette import get_palette_cache, palette_key
+from result_cache import get_result_cache
+from supervisor import ProcessLimits, StageTimeout, StderrTail, Watchdog, kill_process, popen, release
+from trim import build_segment_command, segment_settings, segment_window
+from workspace import Workspace, atomic_output
+
+DEFAULT_ASPECT_RATIO = 16/9
+DEFAULT_RESOLUTION = "420x333"
+DEFAULT_FRAMERATE = 24
+
+PRESETS = [
+    ("360p (480x360)", "480", "360"),
+    ("720p (1280x720)", "1280", "720"),
+    ("1080p (1920x1080)", "1920", "1080"),
+    ("Square (500x500)", "500", "500"),
+    ("Instagram (1080x1350)", "1080", "1350"),
+    ("Story (1080x1920)", "1080", "1920")
+]
+
+ENCODING_MODES = ("Auto", "Single-pass", "Two-pass")
+DITHER_MODES = ("sierra2_4a", "floyd_steinberg", "sierra2", "bayer", "heckbert", "none")
+DEFAULT_MAX_COLORS = 256
+# "streaming" quantises and writes the GIF in-process from raw frames (needs numpy)
+ENCODERS = ("ffmpeg", "streaming")
+# mpdecimate's default: an 8x8 block differing by less than this counts as unchanged
+DEFAULT_MOTION_THRESHOLD = 64 * 12
+# Adaptive fps still emits a frame at least this often during static stretches
+DEFAULT_MIN_FPS = 1.0
+# Optional fields a settings mapping may give on top of the form fields
+SETTING_FIELDS = {"max_colors": int, "dither": str, "profile": str, "encoder": str, "frame_diff": bool,
+                  "adaptive_fps": bool, "motion_threshold": int, "min_fps": float}
+JSON_TYPE_NAMES = {bool: "true or false", int: "an integer", float: "a number", str: "a string"}
+# Upper bound for frames that single-pass keeps buffered while palettegen runs
+SINGLE_PASS_MAX_BUFFER = 1024 * 1024 * 1024
+
+def parse_time_to_seconds(time_str):
+    """Parse time in seconds"""
+    if not time_str:
+        return None
+
+    try:
+        if ':' not in time_str:
+            return float(time_str)
+
+        parts = time_str.split(':')
+        if len(parts) == 3:  # HH:MM:SS
+            hours, minutes, seconds = parts
+            return float(hours) * 3600 + float(minutes) * 60 + float(seconds)
+        elif len(parts) == 2:  # MM:SS
+            minutes, seconds = parts
+            return float(minutes) * 60 + float(seconds)
+        else:
+            raise ValueError("Invalid time format")
+    except ValueError:
+        raise ValueError(f"Invalid time format: {time_str}")
+
+def json_value(name, value, kind):
+    """value checked against the JSON type kind, raising ValueError; integers are accepted as numbers"""
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise ValueError(f"{name} must be {JSON_TYPE_NAMES[kind]}")
+    return value
+
+def get_scale_filter(width, height, flags=DEFAULT_SCALER):
+    """Generate the scale filter for the given dimensions, -1 keeps the aspect ratio"""
+    return f"scale={width or -1}:{height or -1}:flags={flags}"
+
+@dataclass
+class ConversionSettings:
+    """Everything that shapes the output GIF apart from the file paths"""
+    fps: int = DEFAULT_FRAMERATE
+    width: int = None
+    height: int = None
+    start_time: float = None
+    stop_time: float = None
+    crop: tuple = None
+    encoding_mode: str = ENCODING_MODES[0]
+    max_colors: int = DEFAULT_MAX_COLORS
+    dither: str = DITHER_MODES[0]
+    encoder: str = ENCODERS[0]
+    # Store only the changed rectangle of each frame, with unchanged pixels transparent
+    frame_diff: bool = True
+    # Decode speed/quality trade-off, see decode.DECODE_PROFILES
+    profile: str = PROFILE_NAMES[0]
+    # Drop near-duplicate frames and lengthen the delays of the frames kept
+    adaptive_fps: bool = False
+    motion_threshold: int = DEFAULT_MOTION_THRESHOLD
+    min_fps: float = DEFAULT_MIN_FPS
+    # ffmpeg decoder threads, None for its own default
+    threads: int = None
+    # Per-process limits: wall seconds per stage, CPU seconds and address space bytes
+    stage_timeout: float = None
+    cpu_limit: int = None
+    memory_limit: int = None
+    # Fixed palette to apply instead of generating one, e.g. a shared batch palette
+    palette: str = None
+    cache_palette: bool = True
+    # Reuse the GIF of an earlier conversion with the same source and settings
+    cache_result: bool = True
+    # Copy a keyframe-aligned window out of the source once when it would be decoded twice
+    segment_trim: bool = True
+
+    @classmethod
+    def from_form(cls, width, height, fps, start_time="", stop_time="", crop=None,
+                  encoding_mode=ENCODING_MODES[0]):
+        """Build validated settings from user-entered strings, raising ValueError"""
+        try:
+            width = int(width) if width else None
+            height = int(height) if height else None
+        except ValueError:
+            raise ValueError("Width and height must be valid integers")
+
+        try:
+            fps = int(fps)
+        except ValueError:
+            raise ValueError("FPS must be a valid integer")
+
+        if crop is not None:
+            if any(not field for field in crop):
+                raise ValueError("All crop fields must be filled when crop is enabled")
+            try:
+                crop = tuple(map(int, crop))
+            except ValueError:
+                raise ValueError("Crop values must be valid integers")
+
+        settings = cls(
+            fps=fps,
+            width=width,
+            height=height,
+            start_time=parse_time_to_seconds(start_time),
+            stop_time=parse_time_to_seconds(stop_time),
+            crop=crop,
+            encoding_mode=encoding_mode,
+        )
+        settings.validate()
+        return settings
+
+    @classmethod
+    def from_dict(cls, values):
+        """Build validated settings from a JSON mapping with the form's fields, raising ValueError
+
+        Besides the form fields and SETTING_FIELDS, "cache" sets cache_result.
+        Sizes and fps must be JSON integers; trim times are seconds or "MM:SS" strings.
+        """
+        def optional_int(name):
+            value = values.get(name)
+            return None if value is None else json_value(name, value, int)
+
+        def trim_time(name):
+            value = values.get(name)
+            if value is None or isinstance(value, str):
+                return parse_time_to_seconds(value)
+            return json_value(name, value, float)
+
+        crop = values.get("crop")
+        if crop is not None:
+            if not isinstance(crop, list) or len(crop) != 4:
+                raise ValueError("crop must be [width, height, x, y]")
+            crop = tuple(json_value("each crop value", value, int) for value in crop)
+        settings = cls(
+            fps=json_value("fps", values.get("fps", DEFAULT_FRAMERATE), int),
+            width=optional_int("width"),
+            height=optional_int("height"),
+            start_time=trim_time("start_time"),
+            stop_time=trim_time("stop_time"),
+            crop=crop,
+            encoding_mode=json_value("encoding_mode", values.get("encoding_mode", ENCODING_MODES[0]), str),
+        )
+        for field, kind in SETTING_FIELDS.items():
+            if field in values:
+                setattr(settings, field, json_value(field, values[field], kind))
+        settings.cache_result = json_value("cache", values.get("cache", True), bool)
+        settings.validate()
+        return settings
+
+    def validate(self):
+        """Raise ValueError if the settings cannot produce a GIF"""
+        if (self.width is not None and self.width <= 0) or (self.height is not None and self.height <= 0):
+            raise ValueError("Width and height must be positive integers")
+        if self.fps <= 0:
+            raise ValueError("FPS must be a positive integer")
+        if self.start_time is not None and self.stop_time is not None and self.stop_time <= self.start_time:
+            raise ValueError("Stop time must be after start time")
+        if self.crop is not None:
+            w, h, x, y = self.crop
+            if w <= 0 or h <= 0 or x < 0 or y < 0:
+                raise ValueError("Crop width and height must be positive, offsets non-negative")
+        if self.encoding_mode not in ENCODING_MODES:
+            raise ValueError(f"Unknown encoding mode: {self.encoding_mode}")
+        if not 2 <= self.max_colors <= 256:
+            raise ValueError("Palette size must be between 2 and 256 colors")
+        if self.dither not in DITHER_MODES:
+            raise ValueError(f"Unknown dither mode: {self.dither}")
+        if self.encoder not in ENCODERS:
+            raise ValueError(f"Unknown encoder: {self.encoder}")
+        if self.profile not in PROFILE_NAMES:
+            raise ValueError(f"Unknown decode profile: {self.profile}")
+        if self.adaptive_fps and self.encoder != "ffmpeg":
+            raise ValueError("Adaptive FPS needs the ffmpeg encoder, which keeps variable frame delays")
+        if self.motion_threshold <= 0 or self.min_fps <= 0:
+            raise ValueError("Motion threshold and minimum FPS must be positive")
+        if self.threads is not None and self.threads <= 0:
+            raise ValueError("Thread count must be a positive integer")
+        for limit in (self.stage_timeout, self.cpu_limit, self.memory_limit):
+            if limit is not None and limit <= 0:
+                raise ValueError("Timeouts and resource limits must be positive")
+
+@dataclass
+class ProgressEvent:
+    """One progress report from a running ffmpeg stage"""
+    stage: str
+    out_time: float = 0.0
+    duration: float = None
+    frame: int = 0
+    fps: float = None
+    speed: float = None
+    done: bool = False
+
+    @property
+    def percent(self):
+        """Percent of the clip processed, or None if the duration is unknown"""
+        if self.done:
+            return 100.0
+        if not self.duration:
+            return None
+        return min(self.out_time / self.duration * 100, 99.9)
+
+    @property
+    def eta(self):
+        """Estimated seconds remaining for this stage, or None"""
+        if self.done:
+            return 0.0
+        if not self.duration or not self.speed:
+            return None
+        return max(self.duration - self.out_time, 0) / self.speed
+
+def describe_progress(event):
+    """Human readable one-line summary of a ProgressEvent"""
+    parts = []
+    if event.percent is not None:
+        parts.append(f"{event.percent:.0f}%")
+    if event.fps:
+        parts.append(f"{event.fps:.0f} fps")
+    if event.eta is not None:
+        minutes, seconds = divmod(int(event.eta), 60)
+        parts.append(f"ETA {minutes}:{seconds:02d}")
+    return f"{event.stage} {', '.join(parts)}" if parts else event.stage
+
+class ProgressParser:
+    """Turn ffmpeg -progress key=value lines into ProgressEvents"""
+
+    def __init__(self, stage, duration):
+        self.stage = stage
+        self.duration = duration
+        self.values = {}
+
+    def feed(self, line):
+        """Consume one line, returning an event at the end of each report block"""
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+        self.values[key] = value
+        if key != 'progress':
+            return None
+        return ProgressEvent(
+            stage=self.stage,
+            out_time=self._number('out_time_us', 'out_time_ms') / 1_000_000,
+            duration=self.duration,
+            frame=int(self._number('frame')),
+            fps=self._number('fps') or None,
+            speed=self._number('speed') or None,
+            done=value == 'end',
+        )
+
+    def _number(self, *keys):
+        for key in keys:
+            value = self.values.get(key, '').rstrip('x')
+            try:
+                return float(value)
+            except ValueError:
+                continue
+        return 0.0
+
+def run_ffmpeg(cmd, stage, duration=None, on_progress=None, on_process=None, limits=None):
+    """Run ffmpeg streaming -progress reports, raising CalledProcessError on failure
+
+    ffmpeg runs in its own process group under limits (see supervisor) and
+    StageTimeout is raised if it runs too long or stops making progress.
+    Returns the StageMetrics of the run.
+    """
+    cmd = cmd[:1] + ['-nostats', '-progress', 'pipe:1'] + cmd[1:]
+    limits = limits or ProcessLimits()
+    started = time.perf_counter()
+    process = popen(cmd, limits, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, text=True, errors='replace')
+    watchdog = None
+    try:
+        if on_process:
+            on_process(process)
+        stderr_tail = StderrTail(process.stderr)
+        # Progress reports keep coming while ffmpeg is stuck, so only advancing output counts
+        last_advance = [time.monotonic(), None]
+        watchdog = Watchdog(process, limits, lambda: last_advance[0])
+
+        parser = ProgressParser(stage, duration)
+        metrics = StageMetrics(stage)
+        for line in process.stdout:
+            event = parser.feed(line)
+            if event:
+                if (event.frame, event.out_time) != last_advance[1]:
+                    last_advance[:] = [time.monotonic(), (event.frame, event.out_time)]
+                metrics.speed = event.speed or metrics.speed
+                metrics.frames = event.frame or metrics.frames
+                if on_progress:
+                    on_progress(event)
+
+        wait_measured(process, metrics, started)
+        stderr_tail.join()
+    finally:
+        # Also on errors from callbacks or KeyboardInterrupt: the process is reaped before the
+        # watchdog could signal a pid the system may have reused
+        if watchdog:
+            watchdog.stop()
+        kill_process(process)
+        process.wait()
+        release(process)
+    if watchdog.expired:
+        raise StageTimeout(f"{stage.rstrip('.')} {watchdog.expired}")
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr_tail.text())
+    return metrics
+
+def get_video_dimensions(video_path):
+    """Get displayed video dimensions and framerate from the metadata store"""
+    try:
+        metadata = get_store().get(video_path)
+        width, height = metadata.display_size
+        return width, height, metadata.fps
+    except Exception as e:
+        print(e.with_traceback(None))
+        return None, None, None
+
+def get_video_duration(video_path):
+    """Get video duration in seconds from the metadata store"""
+    try:
+        return get_store().get(video_path).duration
+    except Exception:
+        return None
+
+def output_dimensions(settings, input_video):
+    """Exact output width and height, resolving an omitted side from the aspect ratio"""
+    width, height = settings.width, settings.height
+    if width and height:
+        return width, height
+    source_width, source_height, _ = get_video_dimensions(input_video)
+    if settings.crop:
+        source_width, source_height = settings.crop[:2]
+    if not (source_width and source_height):
+        raise ValueError("Cannot determine the output size of this video")
+    if width:
+        return width, round(width * source_height / source_width)
+    if height:
+        return round(height * source_width / source_height), height
+    return source_width, source_height
+
+def get_clip_duration(settings, input_video):
+    """Length of the trimmed clip in seconds, or None if unknown"""
+    stop_time = settings.stop_time
+    if stop_time is None:
+        stop_time = get_video_duration(input_video)
+        if stop_time is None:
+            return None
+    return max(stop_time - (settings.start_time or 0), 0)
+
+def build_video_filter(settings, scale_flags=DEFAULT_SCALER):
+    """Assemble the crop/scale/fps filter chain"""
+    video_filters = []
+
+    if settings.crop:
+        w, h, x, y = settings.crop
+        video_filters.append(f"crop={w}:{h}:{x}:{y}")
+
+    decimate = decimate_filter(settings)
+    if decimate:
+        # mpdecimate only takes YUV: ahead of the scaler it sees the decoded frames, and the scaler
+        # still converts straight to RGB instead of through an extra subsampled YUV step
+        video_filters.extend([f"fps={settings.fps}", decimate])
+    if settings.width or settings.height:
+        video_filters.append(get_scale_filter(settings.width, settings.height, scale_flags))
+    if not decimate:
+        video_filters.append(f"fps={settings.fps}")
+    return ','.join(video_filters)
+
+def decimate_filter(settings):
+    """mpdecimate dropping near-duplicate frames after the fps filter, or None
+
+    Runs of dropped frames are capped so the output never falls below min_fps;
+    the GIF muxer turns the gaps into longer delays.
+    """
+    if not settings.adaptive_fps:
+        return None
+    max_dropped = ceil(settings.fps / settings.min_fps) - 1
+    if max_dropped < 1:
+        return None
+    hi = settings.motion_threshold
+    return f"mpdecimate=hi={hi}:lo={hi * 5 // 12}:frac=0.33:max={max_dropped}"
+
+def palettegen_filter(settings):
+    """palettegen with the requested palette size"""
+    if settings.max_colors == DEFAULT_MAX_COLORS:
+        return "palettegen"
+    return f"palettegen=max_colors={settings.max_colors}"
+
+def paletteuse_filter(settings):
+    """paletteuse with the requested dithering"""
+    options = []
+    if settings.dither != DITHER_MODES[0]:
+        options.append(f"dither={settings.dither}")
+    return "paletteuse=" + ":".join(options) if options else "paletteuse"
+
+def gif_output_options(settings):
+    """GIF muxer options; the encoder's offsetting and transdiff flags are on by default"""
+    options = ['-loop', '0']
+    if decimate_filter(settings):
+        # Keep the timestamps of the frames that survive decimation
+        options.extend(['-fps_mode', 'vfr'])
+    if not settings.frame_diff:
+        options.extend(['-gifflags', '-offsetting-transdiff'])
+    return options
+
+def build_input_options(settings):
+    """Trim options placed before -i"""
+    input_options = []
+    if settings.start_time is not None:
+        input_options.extend(['-ss', str(settings.start_time)])
+    if settings.stop_time is not None:
+        input_options.extend(['-to', str(settings.stop_time)])
+    return input_options
+
+def use_single_pass(settings, input_video):
+    """Decide whether palette and GIF can be produced by one ffmpeg run"""
+    mode = settings.encoding_mode
+    if mode != "Auto":
+        return mode == "Single-pass"
+
+    # Single-pass buffers every scaled frame until palettegen has seen the whole clip
+    clip_length = get_clip_duration(settings, input_video)
+    if clip_length is None:
+        return False
+    width, height = settings.width, settings.height
+    if not (width and height):
+        width, height, _ = get_video_dimensions(input_video)
+        if not (width and height):
+            return False
+    frame_size = width * height * 4
+    return frame_size * ceil(clip_length * settings.fps) <= SINGLE_PASS_MAX_BUFFER
+
+def build_commands(settings, input_video, output_gif, palette_file, cached_palette=None, single_pass=None,
+                   tuning=None):
+    """Build the ffmpeg commands for one conversion as (status, command) pairs
+
+    With cached_palette only the paletteuse pass runs; otherwise the generated
+    palette is always written to palette_file so it can be cached.
+    """
+    tuning = tuning or DecodeTuning()
+    video_filter_str = build_video_filter(settings, tuning.scale_flags)
+    input_options = build_input_options(settings) + tuning.input_options
+    palettegen = palettegen_filter(settings)
+    paletteuse = paletteuse_filter(settings)
+
+    # palettegen only emits its frame at the end, so a null output tapped off the
+    # filter chain keeps -progress reporting how far decoding has got
+    progress_tap = ['-map', '[t]', '-f', 'null', '-']
+
+    gif_cmd = [get_binary("ffmpeg")] + input_options + [
+        '-i', input_video,
+        '-i', cached_palette or palette_file,
+        '-filter_complex', f'{video_filter_str}[x];[x][1:v]{paletteuse}'
+    ] + gif_output_options(settings) + ['-y', output_gif]
+    if cached_palette:
+        return [("Creating GIF...", gif_cmd)]
+
+    if single_pass is None:
+        single_pass = use_single_pass(settings, input_video)
+    if single_pass:
+        single_pass_cmd = [get_binary("ffmpeg")] + input_options + [
+            '-i', input_video,
+            '-filter_complex',
+            f'{video_filter_str},split=3[a][b][t];[a]{palettegen},split[p][q];[b][p]{paletteuse}[g]',
+            '-map', '[g]'
+        ] + gif_output_options(settings) + [
+            '-y', output_gif,
+            '-map', '[q]', '-y', palette_file
+        ] + progress_tap
+        return [("Creating GIF...", single_pass_cmd)]
+
+    palette_cmd = [get_binary("ffmpeg")] + input_options + [
+        '-i', input_video,
+        '-filter_complex', f'{video_filter_str},split[a][t];[a]{palettegen}[p]',
+        '-map', '[p]', '-y', palette_file
+    ] + progress_tap
+    return [("Generating palette...", palette_cmd), ("Creating GIF...", gif_cmd)]
+
+def process_limits(settings):
+    """Supervisor limits for the ffmpeg processes of one conversion"""
+    return ProcessLimits(timeout=settings.stage_timeout, cpu_seconds=settings.cpu_limit,
+                         memory_bytes=settings.memory_limit)
+
+def build_frame_command(settings, input_video, tuning=None):
+    """ffmpeg command that writes the filtered frames to stdout as rawvideo rgb24"""
+    tuning = tuning or DecodeTuning()
+    return [get_binary("ffmpeg"), '-v', 'error'] + build_input_options(settings) + tuning.input_options + [
+        '-i', input_video, '-vf', build_video_filter(settings, tuning.scale_flags),
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'
+    ]
+
+def stream_gif(settings, input_video, palette_file, output_gif, duration=None,
+               on_progress=None, on_process=None, tuning=None, limits=None):
+    """Encode the GIF in-process from a rawvideo pipe (see gif_encoder)"""
+    # Imported here so numpy is only loaded when this backend is used
+    from gif_encoder import stream_encode
+
+    def on_frames(frames):
+        if on_progress:
+            on_progress(ProgressEvent("Creating GIF...", out_time=frames / settings.fps,
+                                      duration=duration, frame=frames))
+
+    stream_encode(build_frame_command(settings, input_video, tuning), settings.width, settings.height,
+                  settings.fps, palette_file, output_gif, on_frames=on_frames, on_process=on_process,
+                  frame_diff=settings.frame_diff, limits=limits)
+    if on_progress:
+        on_progress(ProgressEvent("Creating GIF...", duration=duration, done=True))
+
+def convert(settings, input_video, output_gif, on_status=None, on_progress=None, on_process=None,
+            on_stage=None):
+    """Convert one video to GIF, raising subprocess.CalledProcessError on ffmpeg failure
+
+    on_progress receives ProgressEvents while each stage runs and on_process
+    receives every ffmpeg Popen as it starts, e.g. to cancel it. on_stage
+    receives the StageMetrics of each stage once it finishes. Intermediates go
+    to a private workspace and the GIF is renamed into place only once it is
+    complete.
+    """
+    started = time.time()
+    conversion_id = uuid.uuid4().hex[:12]
+    stages = []
+
+    def finish_stage(metrics):
+        stages.append(metrics)
+        log_stage(conversion_id, input_video, output_gif, metrics)
+        if on_stage:
+            on_stage(metrics)
+
+    def timed(stage, stage_started, **values):
+        finish_stage(StageMetrics(stage, wall_time=time.perf_counter() - stage_started, **values))
+
+    stage_started = time.perf_counter()
+    result_cache = get_result_cache() if settings.cache_result else None
+    result_key = None
+    if result_cache:
+        try:
+            result_key = result_cache.key(settings, input_video)
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            result_key = None
+        if result_key and result_cache.fetch(result_key, output_gif):
+            timed("Reusing cached GIF...", stage_started)
+            if on_status:
+                on_status("Reused a previous conversion")
+            if on_progress:
+                on_progress(ProgressEvent("Creating GIF...", done=True))
+            result_cache.record_job(result_key, input_video, output_gif, settings, started,
+                                    stage_times(stages), cached=True)
+            return output_gif
+
+    streaming = settings.encoder == "streaming"
+    if streaming:
+        # Raw frames need an exact size up front
+        width, height = output_dimensions(settings, input_video)
+        settings = replace(settings, width=width, height=height)
+
+    palette_cache = get_palette_cache()
+    key = None
+    if settings.cache_palette and not settings.palette:
+        try:
+            key = palette_key(settings, input_video)
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            key = None
+    cached_palette = settings.palette or (palette_cache.lookup(key) if key else None)
+
+    limits = process_limits(settings)
+    # A deep trim may copy up to the whole source into the workspace
+    expected_bytes = os.path.getsize(input_video) if settings.segment_trim and settings.stop_time else 0
+    with Workspace("convert_", expected_bytes) as workspace, atomic_output(output_gif) as partial_gif:
+        palette_file = workspace.file("palette.png")
+        duration = get_clip_duration(settings, input_video)
+        single_pass = not streaming and use_single_pass(settings, input_video)
+        source, clip_settings = input_video, settings
+        # Tuned against the original source, which a trim segment shares its codec and size with
+        tuning = decode_tuning(settings, input_video)
+        commands = build_commands(settings, input_video, partial_gif, palette_file, cached_palette, single_pass,
+                                  tuning)
+
+        # Two decoding passes over a deep trim: extract the window once and read both from it
+        window = segment_window(settings, input_video) if settings.segment_trim and len(commands) > 1 else None
+        timed("Probing...", stage_started)
+        if window:
+            segment_file = workspace.file("segment.mkv")
+            cmd = build_segment_command(input_video, segment_file, *window)
+            if on_status:
+                on_status("Extracting clip...")
+            finish_stage(run_ffmpeg(cmd, "Extracting clip...", None, on_progress, on_process, limits))
+            source, clip_settings = segment_file, segment_settings(settings, window[0])
+            commands = build_commands(clip_settings, source, partial_gif,
+                                      palette_file, cached_palette, single_pass, tuning)
+
+        for status, cmd in commands:
+            if on_status:
+                on_status(status)
+            if streaming and cmd is commands[-1][1]:
+                stage_started = time.perf_counter()
+                stream_gif(clip_settings, source, cached_palette or palette_file, partial_gif,
+                           duration, on_progress, on_process, tuning, limits)
+                timed(status, stage_started, write_bytes=os.path.getsize(partial_gif))
+            else:
+                finish_stage(run_ffmpeg(cmd, status, duration, on_progress, on_process, limits))
+        if key and not cached_palette and os.path.exists(palette_file) and os.path.getsize(palette_file) > 0:
+            palette_cache.store(key, palette_file)
+    if result_key:
+        stage_started = time.perf_counter()
+        result_cache.store(result_key, output_gif)
+        timed("Caching result...", stage_started, write_bytes=os.path.getsize(output_gif))
+        result_cache.record_job(result_key, input_video, output_gif, settings, started, stage_times(stages))
+    return output_gif
+
+def stage_times(stages):
+    """Wall seconds per stage name, as kept in the job history"""
+    return {metrics.stage.rstrip("."): metrics.wall_time for metrics in stages}
@@ -0,0 +1,81 @@
+import subprocess
+from dataclasses import dataclass, field
+
+from metadata import get_store
+
+# Decoders that can output at 1/2, 1/4 or 1/8 resolution via -lowres
+LOWRES_CODECS = {"mjpeg", "mpeg1video", "mpeg2video", "mpeg4", "h263", "dvvideo", "jpeg2000"}
+MAX_LOWRES = 3
+# Decoders that honour -skip_loop_filter
+LOOP_FILTER_CODECS = {"h264", "hevc", "vp8"}
+DEFAULT_SCALER = "lanczos"
+
+@dataclass(frozen=True)
+class DecodeProfile:
+    """How far decoding may trade accuracy for speed"""
+    # Decode at low resolution while keeping at least this many source pixels per output pixel
+    lowres_margin: float = None
+    # Skip non-reference frames once the source fps is this many times the output fps
+    skip_nonref_ratio: float = None
+    # Skip the deblocking filter, whose effect mostly disappears when downscaling
+    skip_loop_filter: bool = False
+    # Downscale ratio from which fast_scaler replaces lanczos
+    fast_scaler_ratio: float = None
+    fast_scaler: str = DEFAULT_SCALER
+
+DECODE_PROFILES = {
+    "quality": DecodeProfile(),
+    "balanced": DecodeProfile(lowres_margin=2, skip_nonref_ratio=3, fast_scaler_ratio=4, fast_scaler="bicubic"),
+    "speed": DecodeProfile(lowres_margin=1, skip_nonref_ratio=1.5, skip_loop_filter=True,
+                           fast_scaler_ratio=2, fast_scaler="fast_bilinear"),
+}
+PROFILE_NAMES = tuple(DECODE_PROFILES)
+
+@dataclass
+class DecodeTuning:
+    """Decoder options placed before -i and the scaler used by the filter chain"""
+    input_options: list = field(default_factory=list)
+    scale_flags: str = DEFAULT_SCALER
+
+def downscale_ratio(settings, source_size):
+    """How many source pixels per side go into one output pixel, 1.0 if not downscaled"""
+    source_width, source_height = settings.crop[:2] if settings.crop else source_size
+    ratios = []
+    if settings.width and source_width:
+        ratios.append(source_width / settings.width)
+    if settings.height and source_height:
+        ratios.append(source_height / settings.height)
+    return min(ratios) if ratios else 1.0
+
+def decode_tuning(settings, video_path):
+    """Pick decoder threads, low-resolution decoding, frame skipping and scaler for a conversion"""
+    tuning = DecodeTuning()
+    if settings.threads:
+        tuning.input_options.extend(['-threads', str(settings.threads)])
+    profile = DECODE_PROFILES[settings.profile]
+    if profile == DecodeProfile():
+        return tuning
+
+    try:
+        metadata = get_store().get(video_path)
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return tuning
+    ratio = downscale_ratio(settings, metadata.display_size)
+
+    # Crop offsets are in full resolution pixels and an unscaled output must keep its size
+    if (profile.lowres_margin and metadata.codec in LOWRES_CODECS and not settings.crop
+            and (settings.width or settings.height)):
+        lowres = 0
+        while lowres < MAX_LOWRES and ratio / 2 ** (lowres + 1) >= profile.lowres_margin:
+            lowres += 1
+        if lowres:
+            tuning.input_options.extend(['-lowres', str(lowres)])
+            ratio /= 2 ** lowres
+
+    if profile.skip_nonref_ratio and metadata.fps and metadata.fps / settings.fps >= profile.skip_nonref_ratio:
+        tuning.input_options.extend(['-skip_frame', 'noref'])
+    if profile.skip_loop_filter and metadata.codec in LOOP_FILTER_CODECS:
+        tuning.input_options.extend(['-skip_loop_filter', 'all'])
+    if profile.fast_scaler_ratio and ratio >= profile.fast_scaler_ratio:
+        tuning.scale_flags = profile.fast_scaler
+    return tuning
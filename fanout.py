@@ -0,0 +1,211 @@
+import re
+import subprocess
+import time
+import uuid
+from contextlib import ExitStack
+from dataclasses import replace
+from math import ceil
+from pathlib import Path
+
+from binaries import get_binary
+from converter import (PRESETS, SINGLE_PASS_MAX_BUFFER, ProgressEvent, build_input_options, build_video_filter,
+                       get_clip_duration, gif_output_options, output_dimensions, palettegen_filter,
+                       paletteuse_filter, process_limits, run_ffmpeg, stage_times)
+from decode import DecodeTuning, decode_tuning
+from instrumentation import StageMetrics, log_stage
+from result_cache import get_result_cache
+from workspace import Workspace, atomic_output
+
+# WIDTHxHEIGHT, either side may be omitted, then optional @FPS and /W:H:X:Y crop
+VARIANT_PATTERN = re.compile(r"^(\d*)x(\d*)(?:@(\d+))?(?:/(\d+):(\d+):(\d+):(\d+))?$")
+
+def parse_variant(settings, spec):
+    """Settings for one variant from "480x360", "1080x1920@15/608:1080:656:0" or a preset name like "story"
+
+    Fields the spec leaves out come from settings; trim, palette and decode options are always shared.
+    """
+    for label, width, height in PRESETS:
+        if spec.lower() == label.split()[0].lower():
+            spec = f"{width}x{height}"
+    match = VARIANT_PATTERN.match(spec)
+    if not match or not (match.group(1) or match.group(2)):
+        raise ValueError(f"Invalid variant {spec!r}, expected WIDTHxHEIGHT[@FPS][/W:H:X:Y] or a preset name")
+    width, height, fps = (int(value) if value else None for value in match.group(1, 2, 3))
+    crop = tuple(map(int, match.group(4, 5, 6, 7))) if match.group(4) else settings.crop
+    variant = replace(settings, width=width, height=height, fps=fps or settings.fps, crop=crop)
+    variant.validate()
+    return variant
+
+def variant_output(output_gif, variant):
+    """Output path for one variant, e.g. clip_480x360_12fps.gif"""
+    path = Path(output_gif)
+    name = f"{path.stem}_{variant.width or ''}x{variant.height or ''}"
+    if variant.crop:
+        name += "_crop{}x{}+{}+{}".format(*variant.crop)
+    return str(path.with_name(f"{name}_{variant.fps}fps{path.suffix}"))
+
+def shared_tuning(variants, input_video):
+    """Decoder options every branch can take; each branch keeps its own scaler
+
+    Options are kept only when all variants chose the same value, except
+    -lowres which drops to the smallest level any variant allows.
+    """
+    tunings = [decode_tuning(variant, input_video) for variant in variants]
+    option_sets = [dict(zip(t.input_options[::2], t.input_options[1::2])) for t in tunings]
+    input_options = []
+    for name, value in option_sets[0].items():
+        values = [options.get(name) for options in option_sets]
+        if name == '-lowres' and None not in values:
+            value = str(min(map(int, values)))
+        elif any(v != value for v in values):
+            continue
+        input_options.extend([name, value])
+    return DecodeTuning(input_options), [t.scale_flags for t in tunings]
+
+def use_single_pass(variants, input_video):
+    """Whether every branch's frames fit in the single-pass buffer together"""
+    mode = variants[0].encoding_mode
+    if mode != "Auto":
+        return mode == "Single-pass"
+    clip_length = get_clip_duration(variants[0], input_video)
+    if clip_length is None:
+        return False
+    buffered = 0
+    for variant in variants:
+        try:
+            width, height = output_dimensions(variant, input_video)
+        except ValueError:
+            return False
+        buffered += width * height * 4 * ceil(clip_length * variant.fps)
+    return buffered <= SINGLE_PASS_MAX_BUFFER
+
+def build_fanout_commands(variants, input_video, outputs, palette_files, single_pass, tuning=None,
+                          scale_flags=None):
+    """ffmpeg commands that decode input_video once per pass and write one GIF per variant
+
+    The decoded frames are split into one crop/scale/fps branch per variant. In
+    single-pass mode each branch also generates its own palette; otherwise the
+    first pass writes palette_files and the second applies them.
+    """
+    tuning = tuning or DecodeTuning()
+    scale_flags = scale_flags or [tuning.scale_flags] * len(variants)
+    count = len(variants)
+    chains = [build_video_filter(variant, flags) for variant, flags in zip(variants, scale_flags)]
+    input_options = build_input_options(variants[0]) + tuning.input_options
+    progress_tap = ['-map', '[t]', '-f', 'null', '-']
+    splits = "".join(f"[s{i}]" for i in range(count))
+
+    def gif_outputs(label):
+        args = []
+        for i, (variant, output_gif) in enumerate(zip(variants, outputs)):
+            args += ['-map', f'[{label}{i}]'] + gif_output_options(variant) + ['-y', output_gif]
+        return args
+
+    if single_pass:
+        branches = [
+            f"[s{i}]{chain},split[a{i}][b{i}];[a{i}]{palettegen_filter(variant)}[p{i}];"
+            f"[b{i}][p{i}]{paletteuse_filter(variant)}[g{i}]"
+            for i, (variant, chain) in enumerate(zip(variants, chains))
+        ]
+        cmd = [get_binary("ffmpeg")] + input_options + [
+            '-i', input_video,
+            '-filter_complex', f"[0:v]split={count + 1}{splits}[t];" + ";".join(branches)
+        ] + gif_outputs("g") + progress_tap
+        return [(f"Creating {count} GIFs...", cmd)]
+
+    palette_branches = [
+        f"[s{i}]{chain},{palettegen_filter(variant)}[p{i}]"
+        for i, (variant, chain) in enumerate(zip(variants, chains))
+    ]
+    palette_cmd = [get_binary("ffmpeg")] + input_options + [
+        '-i', input_video,
+        '-filter_complex', f"[0:v]split={count + 1}{splits}[t];" + ";".join(palette_branches)
+    ]
+    for i, palette_file in enumerate(palette_files):
+        palette_cmd += ['-map', f'[p{i}]', '-y', palette_file]
+    palette_cmd += progress_tap
+
+    gif_branches = [
+        f"[s{i}]{chain}[x{i}];[x{i}][{i + 1}:v]{paletteuse_filter(variant)}[g{i}]"
+        for i, (variant, chain) in enumerate(zip(variants, chains))
+    ]
+    gif_cmd = [get_binary("ffmpeg")] + input_options + ['-i', input_video]
+    for palette_file in palette_files:
+        gif_cmd += ['-i', palette_file]
+    gif_cmd += [
+        '-filter_complex', f"[0:v]split={count}{splits};" + ";".join(gif_branches)
+    ] + gif_outputs("g")
+    return [("Generating palettes...", palette_cmd), (f"Creating {count} GIFs...", gif_cmd)]
+
+def convert_variants(variants, input_video, outputs, on_status=None, on_progress=None, on_process=None,
+                     on_stage=None):
+    """Write one GIF per variant from a single decode of input_video, returning the outputs
+
+    Variants share the trim, encoder and limits of the first; each gets its own
+    palette. Variants already in the result cache are reused and left out of
+    the run.
+    """
+    if any(variant.encoder != "ffmpeg" or variant.palette for variant in variants):
+        raise ValueError("Fan-out generates a palette per variant with ffmpeg's GIF encoder; "
+                         "fixed palettes and the streaming encoder are not supported")
+    started = time.time()
+    conversion_id = uuid.uuid4().hex[:12]
+    stages = []
+
+    def finish_stage(metrics):
+        stages.append(metrics)
+        log_stage(conversion_id, input_video, outputs[0], metrics)
+        if on_stage:
+            on_stage(metrics)
+
+    stage_started = time.perf_counter()
+    result_cache = get_result_cache() if variants[0].cache_result else None
+    pending = []
+    keys = {}
+    for variant, output_gif in zip(variants, outputs):
+        key = None
+        if result_cache:
+            try:
+                key = result_cache.key(variant, input_video)
+            except (OSError, ValueError, subprocess.CalledProcessError):
+                key = None
+            if key and result_cache.fetch(key, output_gif):
+                result_cache.record_job(key, input_video, output_gif, variant, started, {}, cached=True)
+                continue
+        keys[output_gif] = key
+        pending.append((variant, output_gif))
+    if not pending:
+        if on_status:
+            on_status("Reused previous conversions")
+        return outputs
+
+    variants, pending_outputs = [list(values) for values in zip(*pending)]
+    duration = get_clip_duration(variants[0], input_video)
+    single_pass = use_single_pass(variants, input_video)
+    tuning, scale_flags = shared_tuning(variants, input_video)
+    limits = process_limits(variants[0])
+    finish_stage(StageMetrics("Probing...", wall_time=time.perf_counter() - stage_started))
+
+    with Workspace("fanout_") as workspace, ExitStack() as stack:
+        partials = [stack.enter_context(atomic_output(output_gif)) for output_gif in pending_outputs]
+        palette_files = [workspace.file(f"palette_{i}.png") for i in range(len(variants))]
+        commands = build_fanout_commands(variants, input_video, partials, palette_files, single_pass, tuning,
+                                         scale_flags)
+        for status, cmd in commands:
+            if on_status:
+                on_status(status)
+            finish_stage(run_ffmpeg(cmd, status, duration, on_progress, on_process, limits))
+
+    if result_cache:
+        stage_started = time.perf_counter()
+        for variant, output_gif in pending:
+            if keys[output_gif]:
+                result_cache.store(keys[output_gif], output_gif)
+        finish_stage(StageMetrics("Caching result...", wall_time=time.perf_counter() - stage_started))
+        for variant, output_gif in pending:
+            if keys[output_gif]:
+                result_cache.record_job(keys[output_gif], input_video, output_gif, variant, started,
+                                        stage_times(stages))
+    if on_progress:
+        on_progress(ProgressEvent(f"Creating {len(variants)} GIFs...", duration=duration, done=True))
+    return outputs
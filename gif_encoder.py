@@ -0,0 +1,315 @@
+import os
+import struct
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from binaries import get_binary
+from supervisor import ProcessLimits, StageTimeout, StderrTail, Watchdog, kill_process, popen, release
+
+# palettegen reserves its last entry for transparency
+TRANSPARENT_INDEX = 255
+# Bits per channel of the nearest-colour lookup table
+LUT_BITS = 5
+# Frames sent to a worker at once
+CHUNK_FRAMES = 8
+MIN_CODE_SIZE = 8
+MAX_CODE = 4096
+
+def load_palette(palette_file):
+    """Read a palettegen PNG as a (256, 3) uint8 array and the number of real colours at its start"""
+    cmd = [
+        get_binary("ffmpeg"), '-v', 'error', '-i', palette_file,
+        '-f', 'rawvideo', '-pix_fmt', 'rgba', '-'
+    ]
+    data = subprocess.run(cmd, capture_output=True, check=True).stdout
+    rgba = np.frombuffer(data[:256 * 4], dtype=np.uint8).reshape(-1, 4)
+    return np.ascontiguousarray(rgba[:, :3]), palette_colors(rgba)
+
+def palette_colors(rgba):
+    """How many entries of an RGBA palette are colours palettegen found
+
+    Unused slots follow the real colours: transparent black in older ffmpeg,
+    repeats of the last colour in newer ones. The transparent slot is never counted.
+    """
+    count = 0
+    while count < min(len(rgba), TRANSPARENT_INDEX):
+        entry = rgba[count]
+        if entry[3] != 255 or (count and (entry == rgba[count - 1]).all()):
+            break
+        count += 1
+    return max(count, 1)
+
+def build_lut(palette, colors=TRANSPARENT_INDEX):
+    """Nearest index among the first colors palette entries for every cell of a 2**LUT_BITS cube"""
+    levels = 1 << LUT_BITS
+    step = 256 // levels
+    centers = np.arange(levels, dtype=np.int32) * step + step // 2
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+    candidates = palette[:min(colors, TRANSPARENT_INDEX)].astype(np.int32)
+
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), 4096):
+        cells = grid[start:start + 4096]
+        distances = ((cells[:, None, :] - candidates[None, :, :]) ** 2).sum(axis=2)
+        lut[start:start + 4096] = distances.argmin(axis=1)
+    return lut.reshape(levels, levels, levels)
+
+def quantize(frame, lut):
+    """Map an (h, w, 3) rgb24 frame to palette indices"""
+    shift = 8 - LUT_BITS
+    return lut[frame[..., 0] >> shift, frame[..., 1] >> shift, frame[..., 2] >> shift]
+
+def lzw_encode(indices, min_code_size=MIN_CODE_SIZE):
+    """GIF LZW compression of a byte string of palette indices"""
+    clear_code = 1 << min_code_size
+    end_code = clear_code + 1
+    code_size = min_code_size + 1
+    next_code = end_code + 1
+    table = {}
+
+    out = bytearray()
+    bit_buffer = 0
+    bit_count = 0
+
+    def emit(code, size):
+        nonlocal bit_buffer, bit_count
+        bit_buffer |= code << bit_count
+        bit_count += size
+        while bit_count >= 8:
+            out.append(bit_buffer & 0xFF)
+            bit_buffer >>= 8
+            bit_count -= 8
+
+    emit(clear_code, code_size)
+    if not indices:
+        emit(end_code, code_size)
+        if bit_count:
+            out.append(bit_buffer & 0xFF)
+        return bytes(out)
+
+    prefix = indices[0]
+    for value in indices[1:]:
+        key = (prefix << 8) | value
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix, code_size)
+        if next_code == MAX_CODE:
+            emit(clear_code, code_size)
+            table.clear()
+            code_size = min_code_size + 1
+            next_code = end_code + 1
+        else:
+            if next_code >= (1 << code_size) and code_size < 12:
+                code_size += 1
+            table[key] = next_code
+            next_code += 1
+        prefix = value
+
+    emit(prefix, code_size)
+    emit(end_code, code_size)
+    if bit_count:
+        out.append(bit_buffer & 0xFF)
+    return bytes(out)
+
+def sub_blocks(data):
+    """Split data into GIF sub-blocks terminated by an empty block"""
+    out = bytearray()
+    for start in range(0, len(data), 255):
+        block = data[start:start + 255]
+        out.append(len(block))
+        out += block
+    out.append(0)
+    return bytes(out)
+
+def image_block(indices, left, top, width, height, delay, transparent=None, disposal=1):
+    """Graphic control extension plus image descriptor and LZW data for one frame"""
+    flags = (disposal << 2) | (1 if transparent is not None else 0)
+    gce = struct.pack('<BBBBHBB', 0x21, 0xF9, 4, flags, delay, transparent or 0, 0)
+    descriptor = struct.pack('<BHHHHB', 0x2C, left, top, width, height, 0)
+    return gce + descriptor + bytes([MIN_CODE_SIZE]) + sub_blocks(lzw_encode(indices))
+
+def gif_header(width, height, palette, loop=0):
+    """GIF89a header with a 256 entry global colour table and looping enabled"""
+    colors = bytes(palette.astype(np.uint8).tobytes()).ljust(256 * 3, b'\0')[:256 * 3]
+    screen = struct.pack('<6sHHBBB', b'GIF89a', width, height, 0xF7, 0, 0)
+    netscape = b'\x21\xFF\x0BNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\x00'
+    return screen + colors + netscape
+
+def frame_delays(fps):
+    """Endless per-frame delays in centiseconds whose sum tracks real time"""
+    index = 0
+    while True:
+        yield round((index + 1) * 100 / fps) - round(index * 100 / fps)
+        index += 1
+
+_worker_lut = None
+
+def _init_worker(lut):
+    global _worker_lut
+    _worker_lut = lut
+
+def changed_region(previous, current):
+    """Bounding box (left, top, right, bottom) of differing pixels, or None if identical"""
+    changed = previous != current
+    rows = np.flatnonzero(changed.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(changed.any(axis=0))
+    return cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+
+def delta_block(previous, current, delay):
+    """Image block drawing only what changed since previous, None if nothing did
+
+    Frames are drawn without disposal, so pixels inside the changed rectangle that
+    already match the canvas are made transparent, which leaves longer runs for LZW.
+    """
+    region = changed_region(previous, current)
+    if region is None:
+        return None
+    left, top, right, bottom = region
+    patch = current[top:bottom, left:right].copy()
+    patch[previous[top:bottom, left:right] == patch] = TRANSPARENT_INDEX
+    return image_block(patch.tobytes(), int(left), int(top), int(right - left), int(bottom - top),
+                       delay, transparent=TRANSPARENT_INDEX)
+
+def _encode_chunk(raw, count, width, height, delays, previous_raw=None, frame_diff=True):
+    """Quantise and compress a chunk of rgb24 frames in a worker process
+
+    Returns (block, delay) pairs; block is None for a frame identical to the one before it.
+    previous_raw is the frame preceding the chunk, needed to diff its first frame.
+    """
+    frames = np.frombuffer(raw, dtype=np.uint8).reshape(count, height, width, 3)
+    previous = None
+    if frame_diff and previous_raw is not None:
+        previous = quantize(np.frombuffer(previous_raw, dtype=np.uint8).reshape(height, width, 3), _worker_lut)
+
+    blocks = []
+    for frame, delay in zip(frames, delays):
+        current = quantize(frame, _worker_lut)
+        if previous is None:
+            block = image_block(current.tobytes(), 0, 0, width, height, delay)
+        else:
+            block = delta_block(previous, current, delay)
+        blocks.append((block, delay))
+        if frame_diff:
+            previous = current
+    return blocks
+
+def _with_delay(block, delay):
+    """Copy of an image block with its graphic control extension delay replaced"""
+    block = bytearray(block)
+    struct.pack_into('<H', block, 4, min(delay, 0xFFFF))
+    return bytes(block)
+
+def stream_encode(frame_cmd, width, height, fps, palette_file, output_gif,
+                  workers=None, on_frames=None, on_process=None, frame_diff=True, limits=None):
+    """Encode rgb24 frames streamed by frame_cmd into output_gif with constant memory
+
+    frame_cmd must write rawvideo rgb24 frames of width x height to stdout.
+    Frames are quantised to the palette by nearest colour, without dithering.
+    With frame_diff each frame only stores the rectangle that changed, and runs
+    of identical frames become one frame with their delays added up.
+    """
+    if np is None:
+        raise RuntimeError("The streaming encoder requires numpy")
+
+    palette, colors = load_palette(palette_file)
+    lut = build_lut(palette, colors)
+    workers = workers or os.cpu_count() or 1
+    delays = frame_delays(fps)
+
+    limits = limits or ProcessLimits()
+    process = popen(frame_cmd, limits, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE)
+    watchdog = None
+    try:
+        if on_process:
+            on_process(process)
+        stderr_tail = StderrTail(process.stderr)
+        last_read = [time.monotonic()]
+        watchdog = Watchdog(process, limits, lambda: last_read[0])
+        frames_read = _encode_stream(process, last_read, width, height, palette, lut, workers, delays,
+                                     output_gif, on_frames, frame_diff)
+        process.wait()
+        stderr_tail.join()
+    finally:
+        # Reaped on every path, and only after the watchdog can no longer signal its pid
+        if watchdog:
+            watchdog.stop()
+        kill_process(process)
+        process.wait()
+        release(process)
+    if watchdog.expired:
+        raise StageTimeout(f"Creating GIF {watchdog.expired}")
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, frame_cmd, stderr=stderr_tail.text())
+    return frames_read
+
+def _encode_stream(process, last_read, width, height, palette, lut, workers, delays,
+                   output_gif, on_frames, frame_diff):
+    """Read chunks from the frame process and write their encoded blocks in order"""
+    frame_size = width * height * 3
+    # Reused for every chunk read from ffmpeg
+    buffer = np.empty((CHUNK_FRAMES, height, width, 3), dtype=np.uint8)
+    view = memoryview(buffer).cast('B')
+    frames_read = 0
+    previous_raw = None
+    with open(output_gif, 'wb') as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(lut,)) as pool:
+        out.write(gif_header(width, height, palette))
+        in_flight = deque()
+        # The last block is held back until the next differing frame fixes its delay
+        pending, pending_delay = None, 0
+
+        def drain(limit):
+            nonlocal frames_read, pending, pending_delay
+            while len(in_flight) > limit:
+                blocks = in_flight.popleft().result()
+                for block, delay in blocks:
+                    if block is None:
+                        pending_delay += delay
+                        continue
+                    if pending is not None:
+                        out.write(_with_delay(pending, pending_delay))
+                    pending, pending_delay = block, delay
+                frames_read += len(blocks)
+                if on_frames:
+                    on_frames(frames_read)
+
+        while True:
+            count = _read_frames(process.stdout, view, frame_size)
+            last_read[0] = time.monotonic()
+            if count:
+                chunk_delays = [next(delays) for _ in range(count)]
+                raw = view[:count * frame_size].tobytes()
+                in_flight.append(pool.submit(_encode_chunk, raw, count, width, height,
+                                             chunk_delays, previous_raw, frame_diff))
+                if frame_diff:
+                    previous_raw = raw[-frame_size:]
+                drain(workers * 2)
+            if count < CHUNK_FRAMES:
+                break
+        drain(0)
+        if pending is not None:
+            out.write(_with_delay(pending, pending_delay))
+        out.write(b'\x3B')
+    return frames_read
+
+def _read_frames(stream, view, frame_size):
+    """Fill the chunk buffer with whole frames, returning how many were read"""
+    filled = 0
+    while filled < len(view):
+        read = stream.readinto(view[filled:])
+        if not read:
+            break
+        filled += read
+    return filled // frame_size
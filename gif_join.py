@@ -0,0 +1,62 @@
+def _skip_sub_blocks(data, pos):
+    """Offset just past the sub-block chain starting at pos"""
+    while data[pos]:
+        pos += data[pos] + 1
+    return pos + 1
+
+def read_gif(data):
+    """Split a GIF into its logical screen descriptor, global colour table and blocks"""
+    if data[:3] != b'GIF':
+        raise ValueError("Not a GIF file")
+    flags = data[10]
+    pos = 13
+    global_table = b''
+    if flags & 0x80:
+        global_table = data[pos:pos + 3 * (2 << (flags & 7))]
+        pos += len(global_table)
+
+    blocks = []
+    while pos < len(data) and data[pos] != 0x3B:
+        kind = data[pos]
+        if kind == 0x21:
+            end = _skip_sub_blocks(data, pos + 2)
+        elif kind == 0x2C:
+            end = pos + 10
+            if data[pos + 9] & 0x80:
+                end += 3 * (2 << (data[pos + 9] & 7))
+            # Skip the LZW minimum code size byte
+            end = _skip_sub_blocks(data, end + 1)
+        else:
+            raise ValueError(f"Unexpected GIF block 0x{kind:02x}")
+        blocks.append(data[pos:end])
+        pos = end
+    return data[:13], global_table, blocks
+
+def with_local_table(block, color_table):
+    """Image descriptor block with color_table attached as its local colour table"""
+    size_bits = (len(color_table) // 3).bit_length() - 2
+    flags = (block[9] & 0x40) | 0x80 | size_bits
+    return block[:9] + bytes([flags]) + color_table + block[10:]
+
+def join_gifs(parts, output_gif):
+    """Concatenate same-sized GIFs into one, keeping the first file's header and loop setting
+
+    Frames of a part whose global colour table differs from the first one get it
+    as a local colour table, so each frame keeps its own colours.
+    """
+    with open(output_gif, 'wb') as out:
+        first_table = None
+        for index, part in enumerate(parts):
+            with open(part, 'rb') as f:
+                screen, global_table, blocks = read_gif(f.read())
+            if index == 0:
+                out.write(screen + global_table)
+                first_table = global_table
+            for block in blocks:
+                if index and block[:2] == b'\x21\xFF':
+                    # Application extensions such as NETSCAPE looping belong once at the start
+                    continue
+                if block[0] == 0x2C and global_table != first_table and not block[9] & 0x80:
+                    block = with_local_table(block, global_table)
+                out.write(block)
+        out.write(b'\x3B')
@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import suppress
+from dataclasses import asdict
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from cache import user_cache_dir
+from converter import ConversionSettings
+from job_queue import DONE, PENDING, RUNNING, JobQueue
+from target_size import parse_size
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SERVICE_DIR = "service"
+# Uploads are written to disk in pieces of this size as they arrive
+UPLOAD_CHUNK = 1024 * 1024
+MAX_UPLOAD_BYTES = 16 * 1024 ** 3
+MAX_JSON_BYTES = 1024 * 1024
+# An upload no running job needs is deleted once no job has used it for this many seconds
+UPLOAD_IDLE_SECONDS = 300
+# Per-process limits the service applies to every job
+LIMIT_FIELDS = ("stage_timeout", "cpu_limit", "memory_limit")
+
+REASONS = {
+    200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 411: "Length Required", 413: "Payload Too Large",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error",
+}
+
+class HTTPError(Exception):
+    """Error response with a status code and a message for the client"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def settings_from_request(body):
+    """Validated ConversionSettings from a job request, using the same rules as the GUI form"""
+    return ConversionSettings.from_dict(body)
+
+def job_json(job):
+    """Status of one job as sent to clients"""
+    progress = job.progress
+    return {
+        "id": job.id,
+        "status": job.status,
+        "message": job.message,
+        "input": os.path.basename(job.input_video),
+        "percent": 100.0 if job.status == DONE else (progress.percent if progress else None),
+        "eta": progress.eta if progress and job.status == RUNNING else None,
+        "stage": progress.stage if progress and job.status == RUNNING else None,
+        "settings": asdict(job.settings),
+        "stages": [asdict(metrics) for metrics in job.metrics],
+    }
+
+class ConversionService:
+    """HTTP front end for a JobQueue; the queue's worker count is the concurrency limit"""
+
+    def __init__(self, work_dir=None, workers=None, limits=None):
+        self.limits = limits or {}
+        self.work_dir = Path(work_dir) if work_dir else user_cache_dir(SERVICE_DIR)
+        self.upload_dir = self.work_dir / "uploads"
+        self.output_dir = self.work_dir / "outputs"
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.queue = JobQueue(workers)
+        self.jobs = {}
+        self.uploads = {}
+        # upload id -> monotonic time it was uploaded or last given to a job
+        self.upload_used = {}
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, query, headers = await read_request_head(reader)
+            await self.route(method, path, query, headers, reader, writer)
+        except HTTPError as e:
+            await send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            with suppress(ConnectionError):
+                await send_json(writer, 500, {"error": str(e)})
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def route(self, method, path, query, headers, reader, writer):
+        self.prune_uploads()
+        parts = [part for part in path.split("/") if part]
+        if parts == ["uploads"] and method == "POST":
+            return await send_json(writer, 201, await self.receive_upload(query, headers, reader))
+        if len(parts) == 2 and parts[0] == "uploads" and method == "DELETE":
+            return await send_json(writer, 200, self.delete_upload(parts[1]))
+        if parts == ["jobs"]:
+            if method == "POST":
+                body = await read_json(headers, reader)
+                return await send_json(writer, 201, self.submit(body))
+            if method == "GET":
+                return await send_json(writer, 200, [job_json(job) for job in self.jobs.values()])
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HTTPError(404, "No such job")
+            if len(parts) == 2 and method == "GET":
+                return await send_json(writer, 200, job_json(job))
+            if len(parts) == 2 and method == "DELETE":
+                return await send_json(writer, *self.delete_job(job))
+            if parts[2:] == ["result"] and method == "GET":
+                return await self.send_result(job, writer)
+        raise HTTPError(404 if method in ("GET", "POST", "DELETE") else 405, "Unknown endpoint")
+
+    async def receive_upload(self, query, headers, reader):
+        """Stream a request body to disk without holding it in memory"""
+        length = content_length(headers, MAX_UPLOAD_BYTES)
+        name = (query.get("name") or ["upload.mp4"])[0]
+        upload_id = uuid.uuid4().hex
+        path = self.upload_dir / f"{upload_id}{Path(name).suffix.lower() or '.mp4'}"
+        remaining = length
+        try:
+            with open(path, "wb") as f:
+                while remaining:
+                    chunk = await reader.read(min(UPLOAD_CHUNK, remaining))
+                    if not chunk:
+                        raise HTTPError(400, "Upload ended early")
+                    await asyncio.to_thread(f.write, chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        self.uploads[upload_id] = str(path)
+        self.upload_used[upload_id] = time.monotonic()
+        return {"upload": upload_id, "bytes": length}
+
+    def upload_in_use(self, path):
+        return any(job.input_video == path and job.status in (PENDING, RUNNING) for job in self.queue.jobs)
+
+    def delete_upload(self, upload_id):
+        path = self.uploads.pop(upload_id, None)
+        self.upload_used.pop(upload_id, None)
+        if path is None:
+            raise HTTPError(404, "No such upload")
+        if not self.upload_in_use(path):
+            Path(path).unlink(missing_ok=True)
+        return {"upload": upload_id, "deleted": True}
+
+    def prune_uploads(self):
+        """Delete uploads whose jobs have finished and that no new job has used for a while"""
+        cutoff = time.monotonic() - UPLOAD_IDLE_SECONDS
+        for upload_id, used in list(self.upload_used.items()):
+            if used < cutoff and not self.upload_in_use(self.uploads[upload_id]):
+                self.delete_upload(upload_id)
+
+    def submit(self, body):
+        for field in ("upload", "input"):
+            if field in body and not isinstance(body[field], str):
+                raise HTTPError(400, f"{field} must be a string")
+        if "upload" in body:
+            input_video = self.uploads.get(body["upload"])
+            if input_video is None:
+                raise HTTPError(404, "No such upload")
+            self.upload_used[body["upload"]] = time.monotonic()
+        elif "input" in body:
+            input_video = body["input"]
+            if not os.path.isfile(input_video):
+                raise HTTPError(400, "Input video file does not exist")
+        else:
+            raise HTTPError(400, "Either upload or input is required")
+        try:
+            settings = settings_from_request(body)
+            for field in LIMIT_FIELDS:
+                if self.limits.get(field) is not None:
+                    setattr(settings, field, self.limits[field])
+            settings.validate()
+        except (ValueError, TypeError) as e:
+            raise HTTPError(400, str(e))
+
+        output_gif = str(self.output_dir / f"{uuid.uuid4().hex}.gif")
+        job = self.queue.submit(input_video, output_gif, settings)
+        self.jobs[str(job.id)] = job
+        return job_json(job)
+
+    def delete_job(self, job):
+        """Cancel a queued or running job, or forget a finished one and its output"""
+        if job.status in (PENDING, RUNNING):
+            self.queue.cancel(job)
+            return 202, job_json(job)
+        self.jobs.pop(str(job.id), None)
+        self.queue.remove(job)
+        Path(job.output_gif).unlink(missing_ok=True)
+        return 200, {"id": job.id, "deleted": True}
+
+    async def send_result(self, job, writer):
+        if job.status != DONE:
+            raise HTTPError(409, f"Job is {job.status.lower()}")
+        size = os.path.getsize(job.output_gif)
+        writer.write(response_head(200, {"Content-Type": "image/gif", "Content-Length": size}))
+        with open(job.output_gif, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+async def read_request_head(reader):
+    """Parse the request line and headers"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "Request head too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), headers
+
+def content_length(headers, limit):
+    try:
+        length = int(headers["content-length"])
+    except (KeyError, ValueError):
+        raise HTTPError(411, "Content-Length is required")
+    if length < 0 or length > limit:
+        raise HTTPError(413, "Request body too large")
+    return length
+
+async def read_json(headers, reader):
+    body = await reader.readexactly(content_length(headers, MAX_JSON_BYTES))
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Body must be JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Body must be a JSON object")
+    return data
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in {**headers, "Connection": "close"}.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def send_json(writer, status, payload):
+    body = json.dumps(payload).encode()
+    writer.write(response_head(status, {"Content-Type": "application/json", "Content-Length": len(body)}))
+    writer.write(body)
+    await writer.drain()
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, work_dir=None, limits=None):
+    service = ConversionService(work_dir, workers, limits)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving on http://{host}:{port} with {service.queue.workers} workers")
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP video to GIF conversion service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--workers", type=int, help="concurrent conversions (default: CPU count)")
+    parser.add_argument("--work-dir", help="where uploads and results are kept (default: the user cache)")
+    parser.add_argument("--timeout", type=float, help="seconds any single ffmpeg stage may run")
+    parser.add_argument("--cpu-limit", type=int, help="CPU seconds any single ffmpeg process may use (Linux)")
+    parser.add_argument("--memory-limit", metavar="SIZE", help="address space limit per ffmpeg process (Linux)")
+    args = parser.parse_args(argv)
+    limits = {
+        "stage_timeout": args.timeout,
+        "cpu_limit": args.cpu_limit,
+        "memory_limit": parse_size(args.memory_limit) if args.memory_limit else None,
+    }
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.work_dir, limits))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from cache import user_cache_dir
+
+# Path of the JSON lines stage log; "off" disables it
+METRICS_LOG_ENV = "VIDEO_TO_GIF_METRICS_LOG"
+METRICS_LOG_FILE = "metrics.jsonl"
+
+_log_lock = threading.Lock()
+
+@dataclass
+class StageMetrics:
+    """Resources one conversion stage used; fields are None where the platform cannot tell"""
+    stage: str
+    wall_time: float = 0.0
+    cpu_time: float = None
+    max_rss_kb: int = None
+    # Bytes passed through read()/write() by the ffmpeg process, pipes included
+    read_bytes: int = None
+    write_bytes: int = None
+    # ffmpeg's last reported speed, as a multiple of real time
+    speed: float = None
+    # Frames ffmpeg reported as output, e.g. to see what adaptive fps dropped
+    frames: int = None
+
+def read_proc_io(pid):
+    """rchar and wchar from /proc/<pid>/io, or (None, None)"""
+    try:
+        with open(f"/proc/{pid}/io", encoding="ascii") as f:
+            values = dict(line.split(": ", 1) for line in f.read().splitlines())
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+def wait_measured(process, metrics, started):
+    """Wait for a Popen, filling metrics with its wall time, rusage and I/O counters"""
+    if not hasattr(os, "wait4"):
+        process.wait()
+        metrics.wall_time = time.perf_counter() - started
+        return metrics
+
+    if hasattr(os, "waitid"):
+        # Wait without reaping so /proc/<pid>/io still describes the exited process
+        try:
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        except ChildProcessError:
+            pass
+        metrics.read_bytes, metrics.write_bytes = read_proc_io(process.pid)
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already reaped by Popen.poll(), e.g. from a concurrent cancel
+        process.wait()
+    else:
+        process.returncode = os.waitstatus_to_exitcode(status)
+        metrics.cpu_time = usage.ru_utime + usage.ru_stime
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        metrics.max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    metrics.wall_time = time.perf_counter() - started
+    return metrics
+
+def metrics_log_path():
+    """Where stage metrics are appended, or None when logging is off"""
+    path = os.environ.get(METRICS_LOG_ENV)
+    if path == "off":
+        return None
+    return path or str(user_cache_dir() / METRICS_LOG_FILE)
+
+def log_stage(conversion_id, input_video, output_gif, metrics):
+    """Append one stage's metrics to the JSON lines log"""
+    path = metrics_log_path()
+    if path is None:
+        return
+    record = {
+        "time": round(time.time(), 3),
+        "conversion": conversion_id,
+        "source": os.path.abspath(input_video),
+        "output": os.path.abspath(output_gif),
+        **asdict(metrics),
+    }
+    line = json.dumps(record) + "\n"
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError:
+        pass
+
+def format_metrics(metrics):
+    """One summary line per stage"""
+    lines = []
+    for m in metrics:
+        parts = [f"{m.wall_time:.1f}s"]
+        if m.cpu_time is not None:
+            parts.append(f"{m.cpu_time:.1f}s CPU")
+        if m.max_rss_kb:
+            parts.append(f"{m.max_rss_kb / 1024:.0f} MB peak")
+        if m.read_bytes is not None:
+            parts.append(f"{m.read_bytes / 1024 ** 2:.0f} MB read, {m.write_bytes / 1024 ** 2:.0f} MB written")
+        if m.frames:
+            parts.append(f"{m.frames} frames")
+        if m.speed:
+            parts.append(f"{m.speed:.2f}x")
+        lines.append(f"{m.stage.rstrip('.')}: {', '.join(parts)}")
+    return "\n".join(lines)
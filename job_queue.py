@@ -0,0 +1,180 @@
+import itertools
+import os
+import queue
+import subprocess
+import threading
+from dataclasses import replace
+from pathlib import Path
+
+from converter import convert
+from metadata import get_store
+from supervisor import kill_process
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".wmv", ".flv", ".webm", ".m4v"}
+
+PENDING = "Pending"
+RUNNING = "Running"
+DONE = "Done"
+FAILED = "Failed"
+CANCELLED = "Cancelled"
+
+def collect_videos(paths):
+    """Expand files and directories into a sorted list of video files"""
+    videos = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            videos.extend(sorted(p for p in path.iterdir()
+                                 if p.is_file() and p.suffix.lower() in VIDEO_EXTENSIONS))
+        elif path.is_file():
+            videos.append(path)
+    return [str(p) for p in videos]
+
+class ConversionJob:
+    """A single queued conversion"""
+    _ids = itertools.count(1)
+
+    def __init__(self, input_video, output_gif, settings):
+        self.id = next(self._ids)
+        self.input_video = input_video
+        self.output_gif = output_gif
+        self.settings = settings
+        self.status = PENDING
+        self.message = ""
+        self.progress = None
+        self.cancelled = False
+        self.process = None
+        # StageMetrics of the last run
+        self.metrics = []
+
+class JobQueue:
+    """Run conversion jobs on a bounded pool of worker threads"""
+
+    def __init__(self, workers=None, on_update=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.on_update = on_update
+        self.jobs = []
+        self._pending = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, input_video, output_gif, settings):
+        """Queue a conversion and return its job"""
+        job = ConversionJob(input_video, output_gif, settings)
+        with self._lock:
+            self.jobs.append(job)
+        self._enqueue(job)
+        return job
+
+    def submit_many(self, paths, settings):
+        """Queue every video in the given files and directories next to its source"""
+        videos = collect_videos(paths)
+        # Warm the metadata store concurrently so workers find their probes cached
+        threading.Thread(target=get_store().get_many, args=(videos,), daemon=True).start()
+        return [self.submit(video, str(Path(video).with_suffix('.gif')), settings)
+                for video in videos]
+
+    def cancel(self, job):
+        """Cancel a pending job or stop a running one"""
+        with self._lock:
+            if job.status not in (PENDING, RUNNING):
+                return
+            job.cancelled = True
+            if job.process is not None:
+                kill_process(job.process)
+            if job.status == PENDING:
+                job.status = CANCELLED
+        self._notify(job)
+
+    def retry(self, job):
+        """Queue a failed or cancelled job again"""
+        with self._lock:
+            if job.status not in (FAILED, CANCELLED):
+                return
+            job.cancelled = False
+            job.message = ""
+            job.progress = None
+            job.metrics = []
+        self._enqueue(job)
+
+    def remove(self, job):
+        """Forget a job that is no longer pending or running"""
+        with self._lock:
+            if job.status not in (PENDING, RUNNING) and job in self.jobs:
+                self.jobs.remove(job)
+
+    def set_workers(self, workers):
+        """Change the number of concurrent conversions"""
+        with self._lock:
+            self.workers = max(1, workers)
+            self._spawn_workers()
+
+    def _enqueue(self, job):
+        with self._lock:
+            job.status = PENDING
+            self._spawn_workers()
+        self._pending.put(job)
+        self._notify(job)
+
+    def _spawn_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker(self):
+        current = threading.current_thread()
+        while True:
+            job = self._pending.get()
+            with self._lock:
+                # Surplus workers retire after the pool has been shrunk
+                if len(self._threads) > self.workers:
+                    self._threads.remove(current)
+                    self._pending.put(job)
+                    return
+                if job.status != PENDING or job.cancelled:
+                    continue
+                job.status = RUNNING
+            self._notify(job)
+            self._run(job)
+            self._notify(job)
+
+    def _run(self, job):
+        def on_status(status):
+            job.message = status
+            self._notify(job)
+
+        def on_progress(event):
+            job.progress = event
+            self._notify(job)
+
+        def on_process(process):
+            with self._lock:
+                job.process = process
+                if job.cancelled:
+                    kill_process(process)
+
+        # Split the cores between workers; the job keeps the settings it actually ran with
+        if job.settings.threads is None and self.workers > 1:
+            job.settings = replace(job.settings, threads=max(1, (os.cpu_count() or 1) // self.workers))
+        try:
+            convert(job.settings, job.input_video, job.output_gif,
+                    on_status=on_status, on_progress=on_progress, on_process=on_process,
+                    on_stage=job.metrics.append)
+            status = DONE
+            message = ""
+        except subprocess.CalledProcessError as e:
+            status = CANCELLED if job.cancelled else FAILED
+            lines = (e.stderr or "").strip().splitlines()
+            message = "" if job.cancelled else (
+                lines[-1] if lines else f"FFmpeg command failed with return code {e.returncode}")
+        except Exception as e:
+            status = FAILED
+            message = str(e)
+        with self._lock:
+            job.status = status
+            job.message = message
+            job.process = None
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
@@ -0,0 +1,94 @@
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from benchmark import SOURCES, generate_source
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+TERMINAL_STATUSES = ("Done", "Failed", "Cancelled")
+
+def request(url, method, path, body=None, headers=None):
+    """Send one request and return (status, decoded JSON or raw bytes)"""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        if response.getheader("Content-Type") == "application/json":
+            data = json.loads(data)
+        return response.status, data
+    finally:
+        connection.close()
+
+def upload(url, video_path):
+    """Stream a local video to the service, returning its upload id"""
+    with open(video_path, "rb") as f:
+        status, data = request(url, "POST", f"/uploads?name={os.path.basename(video_path)}", f,
+                               {"Content-Length": str(os.path.getsize(video_path))})
+    if status != 201:
+        raise RuntimeError(f"upload failed: {status} {data}")
+    return data["upload"]
+
+def run_job(url, job_request, poll_interval):
+    """Submit a job, wait for it and download the result, returning (status, latency, bytes)"""
+    started = time.perf_counter()
+    status, job = request(url, "POST", "/jobs", json.dumps(job_request),
+                          {"Content-Type": "application/json"})
+    if status != 201:
+        return f"rejected ({job.get('error')})", time.perf_counter() - started, 0
+    while job["status"] not in TERMINAL_STATUSES:
+        time.sleep(poll_interval)
+        _, job = request(url, "GET", f"/jobs/{job['id']}")
+    size = 0
+    if job["status"] == "Done":
+        _, gif = request(url, "GET", f"/jobs/{job['id']}/result")
+        size = len(gif)
+    request(url, "DELETE", f"/jobs/{job['id']}")
+    return job["status"], time.perf_counter() - started, size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure conversion service throughput with synthetic videos")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--source", default="720p30-10s", choices=sorted(SOURCES))
+    parser.add_argument("-n", "--jobs", type=int, default=16, help="jobs to submit")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="clients submitting at once")
+    parser.add_argument("--width", type=int, default=480)
+    parser.add_argument("--fps", type=int, default=12)
+    parser.add_argument("--poll", type=float, default=0.25, help="seconds between status polls")
+    parser.add_argument("--allow-cache", action="store_true",
+                        help="let the service reuse results; by default every job encodes")
+    args = parser.parse_args(argv)
+
+    video_path, _ = generate_source(args.source)
+    started = time.perf_counter()
+    upload_id = upload(args.url, video_path)
+    upload_time = time.perf_counter() - started
+    print(f"uploaded {os.path.getsize(video_path) / 1024 ** 2:.1f} MB in {upload_time:.2f}s")
+
+    job_request = {"upload": upload_id, "width": args.width, "fps": args.fps, "cache": args.allow_cache}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        results = list(pool.map(lambda _: run_job(args.url, job_request, args.poll), range(args.jobs)))
+    wall_time = time.perf_counter() - started
+    request(args.url, "DELETE", f"/uploads/{upload_id}")
+
+    latencies = sorted(latency for status, latency, _ in results if status == "Done")
+    failures = [status for status, _, _ in results if status != "Done"]
+    print(f"{len(latencies)}/{len(results)} jobs done in {wall_time:.2f}s "
+          f"({len(latencies) / wall_time * 60:.1f} jobs/min)")
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"latency: median {statistics.median(latencies):.2f}s, p95 {p95:.2f}s, max {latencies[-1]:.2f}s")
+    for status in sorted(set(failures)):
+        print(f"{failures.count(status)} jobs {status.lower()}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
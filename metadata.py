@@ -0,0 +1,183 @@
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from binaries import get_binary
+from cache import user_cache_dir
+
+METADATA_FILE = "metadata.json"
+DEFAULT_MAX_ENTRIES = 2000
+
+@dataclass
+class VideoMetadata:
+    """What one ffprobe run tells us about a source video"""
+    path: str
+    size: int
+    mtime_ns: int
+    width: int = None
+    height: int = None
+    fps: float = None
+    duration: float = None
+    rotation: int = 0
+    codec: str = None
+    frame_count: int = None
+
+    @property
+    def display_size(self):
+        """Width and height after ffmpeg applies the rotation"""
+        if self.rotation % 180:
+            return self.height, self.width
+        return self.width, self.height
+
+def _parse_rate(rate):
+    """Parse an ffprobe frame rate such as 30000/1001"""
+    try:
+        dividend, divisor = rate.split("/")
+        return int(dividend) / int(divisor) if int(divisor) else None
+    except (AttributeError, ValueError):
+        return None
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def probe_video(path, stat=None):
+    """Collect all the stream and format fields we need with a single ffprobe run"""
+    stat = stat or os.stat(path)
+    cmd = [
+        get_binary("ffprobe"), '-v', 'error', '-select_streams', 'v:0',
+        '-show_streams', '-show_format', '-of', 'json', path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    info = json.loads(result.stdout)
+    stream = (info.get('streams') or [{}])[0]
+    fmt = info.get('format', {})
+
+    rotation = stream.get('tags', {}).get('rotate')
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            rotation = side_data['rotation']
+    frame_count = stream.get('nb_frames')
+
+    return VideoMetadata(
+        path=os.path.abspath(path),
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        width=stream.get('width'),
+        height=stream.get('height'),
+        fps=_parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate')),
+        duration=_parse_float(fmt.get('duration')) or _parse_float(stream.get('duration')),
+        rotation=int(float(rotation or 0)) % 360,
+        codec=stream.get('codec_name'),
+        frame_count=int(frame_count) if frame_count and frame_count.isdigit() else None,
+    )
+
+class MetadataStore:
+    """On-disk ffprobe cache keyed by path, mtime and size with LRU eviction"""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or str(user_cache_dir() / METADATA_FILE)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, video_path):
+        """Return metadata for a video, probing it only if it changed"""
+        metadata = self._lookup(video_path)
+        if metadata is None:
+            metadata = self._probe(video_path)
+            self._save()
+        return metadata
+
+    def get_many(self, video_paths, workers=None):
+        """Probe several videos concurrently, returning {path: metadata or None}"""
+        results = {}
+        missing = []
+        for video_path in video_paths:
+            try:
+                metadata = self._lookup(video_path)
+            except OSError:
+                results[video_path] = None
+                continue
+            if metadata is None:
+                missing.append(video_path)
+            else:
+                results[video_path] = metadata
+
+        if missing:
+            def probe(video_path):
+                try:
+                    return self._probe(video_path)
+                except (OSError, ValueError, subprocess.CalledProcessError):
+                    return None
+
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+                results.update(zip(missing, pool.map(probe, missing)))
+            self._save()
+        return results
+
+    def _lookup(self, video_path):
+        key = os.path.abspath(video_path)
+        stat = os.stat(key)
+        with self._lock:
+            metadata = self._entries.get(key)
+            if metadata is None or metadata.size != stat.st_size or metadata.mtime_ns != stat.st_mtime_ns:
+                return None
+            self._entries.move_to_end(key)
+            return metadata
+
+    def _probe(self, video_path):
+        metadata = probe_video(video_path)
+        with self._lock:
+            self._entries[metadata.path] = metadata
+            self._entries.move_to_end(metadata.path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return metadata
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+            for entry in entries:
+                metadata = VideoMetadata(**entry)
+                self._entries[metadata.path] = metadata
+        except (OSError, ValueError, TypeError):
+            self._entries.clear()
+
+    def _save(self):
+        with self._lock:
+            entries = [asdict(metadata) for metadata in self._entries.values()]
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+def source_identity(video_path):
+    """Identify a source by path, size and mtime"""
+    metadata = get_store().get(video_path)
+    return [metadata.path, metadata.size, metadata.mtime_ns]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Shared metadata store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetadataStore()
+        return _store
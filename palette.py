@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from binaries import get_binary
+from cache import user_cache_dir
+from metadata import get_store, source_identity
+from workspace import Workspace
+
+PALETTE_DIR = "palettes"
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Frames sampled from every clip when building a shared palette
+DEFAULT_SAMPLES_PER_CLIP = 12
+# palettegen only counts colours, so samples are squashed to a fixed size
+SAMPLE_SIZE = "320:180"
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def palette_key(settings, video_path):
+    """Cache key for the palette of one conversion"""
+    return _digest({
+        'source': source_identity(video_path),
+        'trim': [settings.start_time, settings.stop_time],
+        'crop': settings.crop,
+        'scale': [settings.width, settings.height],
+        'fps': settings.fps,
+        'max_colors': settings.max_colors,
+        'profile': settings.profile,
+        'decimate': [settings.motion_threshold, settings.min_fps] if settings.adaptive_fps else None,
+    })
+
+def shared_palette_key(settings, video_paths, samples_per_clip):
+    """Cache key for a palette sampled from several clips"""
+    return _digest({
+        'sources': sorted(source_identity(path) for path in video_paths),
+        'trim': [settings.start_time, settings.stop_time],
+        'crop': settings.crop,
+        'samples': samples_per_clip,
+        'max_colors': settings.max_colors,
+    })
+
+class PaletteCache:
+    """Directory of palette PNGs with size-bounded LRU eviction"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or str(user_cache_dir(PALETTE_DIR))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def lookup(self, key):
+        """Return the cached palette path, or None"""
+        path = self.path_for(key)
+        try:
+            # mtime doubles as the last-used time for eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def store(self, key, palette_file):
+        """Copy a freshly generated palette into the cache"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        try:
+            shutil.copyfile(palette_file, tmp_path)
+            os.replace(tmp_path, self.path_for(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return None
+        self._evict()
+        return self.path_for(key)
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except OSError:
+                    pass
+
+_cache = None
+
+def get_palette_cache():
+    """Shared palette cache"""
+    global _cache
+    if _cache is None:
+        _cache = PaletteCache()
+    return _cache
+
+def sample_times(settings, duration, count):
+    """Evenly spaced timestamps inside the trimmed range"""
+    start = settings.start_time or 0
+    stop = settings.stop_time if settings.stop_time is not None else duration
+    if stop is None or stop <= start:
+        return [start]
+    step = (stop - start) / count
+    return [start + step * (i + 0.5) for i in range(count)]
+
+def build_shared_palette(settings, video_paths, samples_per_clip=DEFAULT_SAMPLES_PER_CLIP, on_status=None):
+    """Build one palette from frames sampled across several clips, reusing a cached one"""
+    cache = get_palette_cache()
+    key = shared_palette_key(settings, video_paths, samples_per_clip)
+    cached = cache.lookup(key)
+    if cached:
+        return cached
+
+    sample_filters = []
+    if settings.crop:
+        w, h, x, y = settings.crop
+        sample_filters.append(f"crop={w}:{h}:{x}:{y}")
+    sample_filters.append(f"scale={SAMPLE_SIZE}")
+    sample_filter_str = ','.join(sample_filters)
+
+    with Workspace("shared_palette_") as workspace:
+        work_dir = workspace.path
+        index = 0
+        for video_path in video_paths:
+            if on_status:
+                on_status(f"Sampling {os.path.basename(video_path)}...")
+            duration = get_store().get(video_path).duration
+            for timestamp in sample_times(settings, duration, samples_per_clip):
+                frame_file = os.path.join(work_dir, f"frame_{index:05d}.png")
+                cmd = [
+                    get_binary("ffmpeg"), '-v', 'error', '-ss', str(timestamp), '-i', video_path,
+                    '-frames:v', '1', '-vf', sample_filter_str, '-y', frame_file
+                ]
+                subprocess.run(cmd, check=True, capture_output=True)
+                if os.path.exists(frame_file):
+                    index += 1
+
+        if on_status:
+            on_status("Generating shared palette...")
+        palette_file = os.path.join(work_dir, "palette.png")
+        cmd = [
+            get_binary("ffmpeg"), '-v', 'error', '-i', os.path.join(work_dir, 'frame_%05d.png'),
+            '-vf', f'palettegen=stats_mode=full:max_colors={settings.max_colors}', '-y', palette_file
+        ]
+        subprocess.run(cmd, check=True, capture_output=True)
+        shared_palette = cache.store(key, palette_file)
+        if shared_palette is None:
+            raise RuntimeError("Could not store the shared palette")
+        return shared_palette
@@ -0,0 +1,69 @@
+import subprocess
+import threading
+from collections import OrderedDict
+
+from binaries import get_binary
+from metadata import get_store, source_identity
+
+PREVIEW_FRAMES = 8
+PREVIEW_WIDTH = 320
+# Decoded preview frames kept in memory across recently opened sources
+FRAME_CACHE_SIZE = 96
+
+class FrameCache:
+    """In-memory LRU of downscaled PNG frames keyed by source identity and timestamp"""
+
+    def __init__(self, max_frames=FRAME_CACHE_SIZE):
+        self.max_frames = max_frames
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        with self._lock:
+            self._frames[key] = frame
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+
+_cache = FrameCache()
+
+def strip_times(start, stop, count=PREVIEW_FRAMES):
+    """Evenly spaced timestamps across [start, stop]"""
+    if stop is None or stop <= start:
+        return [start]
+    step = (stop - start) / count
+    return [round(start + step * (i + 0.5), 3) for i in range(count)]
+
+def extract_frame(video_path, timestamp, width=PREVIEW_WIDTH):
+    """Decode one downscaled frame at timestamp as PNG bytes"""
+    cmd = [
+        get_binary("ffmpeg"), '-v', 'error', '-ss', str(timestamp), '-i', video_path,
+        '-frames:v', '1', '-vf', f'scale={width}:-2', '-f', 'image2pipe', '-c:v', 'png', '-'
+    ]
+    return subprocess.run(cmd, capture_output=True, check=True).stdout
+
+def load_strip(video_path, start_time=None, stop_time=None, count=PREVIEW_FRAMES, width=PREVIEW_WIDTH):
+    """Downscaled frames sampled across the trim range as [(timestamp, png bytes)]"""
+    identity = tuple(source_identity(video_path))
+    duration = get_store().get(video_path).duration
+    start = start_time or 0
+    stop = stop_time if stop_time is not None else duration
+
+    frames = []
+    for timestamp in strip_times(start, stop, count):
+        key = (identity, timestamp, width)
+        frame = _cache.get(key)
+        if frame is None:
+            frame = extract_frame(video_path, timestamp, width)
+            if not frame:
+                continue
+            _cache.put(key, frame)
+        frames.append((timestamp, frame))
+    return frames
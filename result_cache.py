@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import asdict
+
+from cache import user_cache_dir
+from metadata import source_identity
+from workspace import create_partial
+
+RESULT_DIR = "results"
+INDEX_FILE = "index.sqlite"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Bytes hashed from each end of the source when content hashing is on
+PARTIAL_HASH_BYTES = 1024 * 1024
+# Settings that change how a GIF is produced but not what it contains
+IGNORED_SETTINGS = ("encoding_mode", "cache_palette", "cache_result", "segment_trim", "threads",
+                    "stage_timeout", "cpu_limit", "memory_limit")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT,
+    source TEXT NOT NULL,
+    output TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    started REAL NOT NULL,
+    wall_time REAL NOT NULL,
+    cached INTEGER NOT NULL,
+    stages TEXT NOT NULL
+);
+"""
+
+def partial_hash(path, block_size=PARTIAL_HASH_BYTES):
+    """sha256 of the first and last block of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read(block_size))
+        f.seek(max(0, os.fstat(f.fileno()).st_size - block_size))
+        digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+def normalized_settings(settings):
+    """Settings that determine the output GIF, with a fixed palette replaced by a hash of its contents
+
+    Palette PNGs are about a kilobyte, so hashing is cheaper than probing them, and a
+    shared palette rebuilt at another temporary path still gives the same key.
+    """
+    values = asdict(settings)
+    for name in IGNORED_SETTINGS:
+        values.pop(name, None)
+    if settings.palette:
+        with open(settings.palette, "rb") as f:
+            values["palette"] = hashlib.sha256(f.read()).hexdigest()
+    return values
+
+def result_key(settings, video_path, hash_content=True):
+    """Cache key for the GIF one conversion produces"""
+    payload = {
+        "source": source_identity(video_path),
+        "content": partial_hash(video_path) if hash_content else None,
+        "settings": normalized_settings(settings),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+class ResultCache:
+    """Finished GIFs keyed by source and settings, with a SQLite index of results and job timings"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, hash_content=True):
+        self.directory = directory or str(user_cache_dir(RESULT_DIR))
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.gif")
+
+    def key(self, settings, video_path):
+        return result_key(settings, video_path, self.hash_content)
+
+    def lookup(self, key):
+        """Return the cached GIF path, or None"""
+        path = self.path_for(key)
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                intact = os.path.getsize(path) == row[0]
+            except OSError:
+                intact = False
+            if not intact:
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        return path
+
+    def fetch(self, key, output_gif):
+        """Copy the cached GIF to output_gif; False on a miss"""
+        cached = self.lookup(key)
+        if cached is None:
+            return False
+        output_dir = os.path.dirname(os.path.abspath(output_gif))
+        tmp_path = create_partial(output_dir, ".", ".part")
+        try:
+            # A copy, not a link, for the same reason as in store()
+            shutil.copyfile(cached, tmp_path)
+            os.replace(tmp_path, output_gif)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return False
+        return True
+
+    def store(self, key, gif_path):
+        """Copy a finished GIF into the cache"""
+        tmp_path = create_partial(self.directory, "", ".part")
+        try:
+            # A copy, not a link: the output may still be edited in place by the user
+            shutil.copyfile(gif_path, tmp_path)
+            os.replace(tmp_path, self.path_for(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return None
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, size, created, last_used, hits) VALUES (?, ?, ?, ?, 0)",
+                (key, os.path.getsize(self.path_for(key)), now, now),
+            )
+            self._evict(db)
+        return self.path_for(key)
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(self.path_for(key))
+            except OSError:
+                pass
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+
+    def record_job(self, key, video_path, output_gif, settings, started, stages, cached=False):
+        """Add one conversion to the job history with its per-stage wall times in seconds"""
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (key, source, output, settings, started, wall_time, cached, stages) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, os.path.abspath(video_path), os.path.abspath(output_gif),
+                 json.dumps(asdict(settings)), started, time.time() - started, int(cached), json.dumps(stages)),
+            )
+
+    def history(self, limit=50):
+        """Most recent jobs first, as dicts"""
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            rows = db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row, settings=json.loads(row["settings"]), stages=json.loads(row["stages"])) for row in rows]
+
+    def stage_totals(self):
+        """Total seconds and job count per stage across the whole history"""
+        totals = {}
+        with self._connect() as db:
+            for (stages,) in db.execute("SELECT stages FROM jobs WHERE cached = 0"):
+                for stage, seconds in json.loads(stages).items():
+                    total, count = totals.get(stage, (0.0, 0))
+                    totals[stage] = (total + seconds, count + 1)
+        return totals
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache():
+    """Shared result cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+def main():
+    """Print the recent job history and where conversion time went"""
+    cache = get_result_cache()
+    for job in reversed(cache.history()):
+        source = os.path.basename(job["source"])
+        label = "cached" if job["cached"] else ", ".join(f"{k} {v:.1f}s" for k, v in job["stages"].items())
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(job['started']))}  "
+              f"{source}  {job['wall_time']:.1f}s  ({label})")
+    print()
+    for stage, (total, count) in sorted(cache.stage_totals().items(), key=lambda item: -item[1][0]):
+        print(f"{stage}: {total:.1f}s over {count} jobs, {total / count:.1f}s average")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import atexit
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Lines of stderr kept per process for error reporting
+STDERR_TAIL_LINES = 50
+# Longer stderr lines are cut to this many characters
+STDERR_LINE_LIMIT = 1000
+# An ffmpeg that reports no progress for this long is considered stuck
+STALL_TIMEOUT = 300
+WATCHDOG_INTERVAL = 1.0
+
+_live = set()
+_live_lock = threading.Lock()
+
+class StageTimeout(Exception):
+    """A supervised process ran past its time limit or stopped making progress"""
+
+@dataclass
+class ProcessLimits:
+    """Per-process limits; None leaves a limit off"""
+    # Wall seconds one stage may take
+    timeout: float = None
+    # Seconds without output before the process counts as stalled
+    stall_timeout: float = STALL_TIMEOUT
+    cpu_seconds: int = None
+    memory_bytes: int = None
+
+class CancelToken:
+    """Cooperative cancellation shared by the stages of one job
+
+    Pass attach as the on_process callback; processes started after cancel()
+    are killed as soon as they are attached.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._process = None
+        self._lock = threading.Lock()
+
+    def attach(self, process):
+        with self._lock:
+            self._process = process
+            if self.cancelled:
+                kill_process(process)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._process is not None:
+                kill_process(self._process)
+
+def popen(cmd, limits=None, **kwargs):
+    """Start a process in its own process group, tracked so it can be killed on exit"""
+    if os.name == "nt":
+        kwargs.setdefault("creationflags", subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        kwargs.setdefault("start_new_session", True)
+    process = subprocess.Popen(cmd, **kwargs)
+    with _live_lock:
+        _live.add(process)
+    if limits:
+        apply_limits(process.pid, limits)
+    return process
+
+def apply_limits(pid, limits):
+    """Set CPU and address space limits on a running process where the platform allows it"""
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        if limits.cpu_seconds:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 5))
+        if limits.memory_bytes:
+            resource.prlimit(pid, resource.RLIMIT_AS, (limits.memory_bytes, limits.memory_bytes))
+    except (OSError, ValueError):
+        pass
+
+def release(process):
+    """Stop tracking a process that has been waited for"""
+    with _live_lock:
+        _live.discard(process)
+
+def kill_process(process):
+    """Kill a process and everything in its process group"""
+    if process.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def kill_all():
+    """Kill every supervised process that is still running"""
+    with _live_lock:
+        processes = list(_live)
+    for process in processes:
+        kill_process(process)
+
+atexit.register(kill_all)
+
+class StderrTail:
+    """Drain a stderr pipe on a thread, keeping only the last lines"""
+
+    def __init__(self, stream, lines=STDERR_TAIL_LINES):
+        self.lines = deque(maxlen=lines)
+        self.last_activity = time.monotonic()
+        self._thread = threading.Thread(target=self._drain, args=(stream,), daemon=True)
+        self._thread.start()
+
+    def _drain(self, stream):
+        for line in stream:
+            self.lines.append(line[:STDERR_LINE_LIMIT])
+            self.last_activity = time.monotonic()
+
+    def join(self):
+        self._thread.join()
+
+    def text(self):
+        tail = [line.decode(errors="replace") if isinstance(line, bytes) else line for line in self.lines]
+        return "".join(tail)
+
+class Watchdog:
+    """Kill a process that exceeds its timeout or goes quiet for longer than its stall timeout"""
+
+    def __init__(self, process, limits, activity):
+        self.process = process
+        self.limits = limits
+        # Callable returning the monotonic time the process last showed progress
+        self.activity = activity
+        self.started = time.monotonic()
+        self.expired = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while not self._done.wait(WATCHDOG_INTERVAL):
+            now = time.monotonic()
+            if self.limits.timeout and now - self.started > self.limits.timeout:
+                self.expired = f"timed out after {self.limits.timeout:.0f}s"
+            elif self.limits.stall_timeout and now - self.activity() > self.limits.stall_timeout:
+                self.expired = f"made no progress for {self.limits.stall_timeout:.0f}s"
+            if self.expired:
+                kill_process(self.process)
+                return
+
+    def stop(self):
+        """Stop watching; once this returns the process is never killed by the watchdog"""
+        self._done.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
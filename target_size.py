@@ -0,0 +1,124 @@
+import os
+import re
+import shutil
+from dataclasses import replace
+
+from converter import convert, get_clip_duration, output_dimensions
+from workspace import Workspace, atomic_output
+
+# Seconds encoded to estimate bytes per pixel
+SAMPLE_SECONDS = 2.0
+# Palette/dither levels tried from best looking to smallest output
+QUALITY_LEVELS = [
+    (256, "sierra2_4a"),
+    (256, "bayer"),
+    (128, "bayer"),
+    (64, "bayer"),
+    (32, "none"),
+]
+# Shrinking below this scale is only done once every quality level has been tried
+PREFERRED_MIN_SCALE = 0.5
+MIN_SCALE = 0.1
+# Framerate is reduced before the scale drops under PREFERRED_MIN_SCALE, but not below this
+MIN_FPS = 8
+MAX_FULL_ENCODES = 3
+# Aim slightly below the budget to absorb estimation error
+SAFETY_MARGIN = 0.95
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2, "G": 1024 ** 3, "GB": 1024 ** 3}
+
+def parse_size(text):
+    """Parse sizes such as 8MB, 15M or 500K into bytes"""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B?)\s*", text.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+def scaled(settings, base, scale, fps, level):
+    """Settings at a fraction of the base size, keeping its aspect ratio"""
+    width, height = base
+    max_colors, dither = level
+    return replace(
+        settings,
+        width=max(1, round(width * scale)),
+        height=max(1, round(height * scale)),
+        fps=fps,
+        max_colors=max_colors,
+        dither=dither,
+        cache_palette=False,
+    )
+
+def sample_settings(settings, duration):
+    """Trim a short sample out of the middle of the clip"""
+    start = (settings.start_time or 0) + max(duration - SAMPLE_SECONDS, 0) / 2
+    return replace(settings, start_time=start, stop_time=start + min(SAMPLE_SECONDS, duration), cache_result=False)
+
+def bytes_per_pixel(settings, input_video, duration, on_process=None):
+    """Encode a short sample and measure output bytes per pixel per frame"""
+    sample = sample_settings(settings, duration)
+    with Workspace("sample_") as workspace:
+        sample_file = workspace.file("sample.gif")
+        convert(sample, input_video, sample_file, on_process=on_process)
+        size = os.path.getsize(sample_file)
+    pixels = sample.width * sample.height * sample.fps * (sample.stop_time - sample.start_time)
+    return size / max(pixels, 1)
+
+def fit(base, fps, pixel_budget):
+    """Scale and fps that fit the pixel budget, reducing fps before going under PREFERRED_MIN_SCALE"""
+    width, height = base
+    scale = min(1.0, (pixel_budget / (width * height * fps)) ** 0.5)
+    if scale >= PREFERRED_MIN_SCALE:
+        return scale, fps
+    reduced_fps = max(min(fps, MIN_FPS), pixel_budget / (width * height * PREFERRED_MIN_SCALE ** 2))
+    reduced_fps = min(fps, int(reduced_fps))
+    scale = min(1.0, (pixel_budget / (width * height * reduced_fps)) ** 0.5)
+    return max(scale, MIN_SCALE), reduced_fps
+
+def convert_to_size(settings, input_video, output_gif, target_bytes,
+                    on_status=None, on_progress=None, on_process=None, on_stage=None):
+    """Convert to a GIF no larger than target_bytes, returning the settings used
+
+    Trials are encoded in a workspace; output_gif is only written by one that fits.
+    """
+    duration = get_clip_duration(settings, input_video)
+    if not duration:
+        raise ValueError("Cannot determine the clip duration")
+    base = output_dimensions(settings, input_video)
+    budget = target_bytes * SAFETY_MARGIN
+
+    # Estimate each quality level from short samples and take the best one that fits
+    candidate = None
+    for level in QUALITY_LEVELS:
+        if on_status:
+            on_status(f"Estimating size ({level[0]} colors, {level[1]})...")
+        probe = scaled(settings, base, PREFERRED_MIN_SCALE, settings.fps, level)
+        bpp = bytes_per_pixel(probe, input_video, duration, on_process)
+        scale, fps = fit(base, settings.fps, budget / (bpp * duration))
+        candidate = (scale, fps, level)
+        if scale >= PREFERRED_MIN_SCALE:
+            break
+
+    scale, fps, level = candidate
+    # Refine once at the chosen size: small frames compress differently per pixel
+    trial = scaled(settings, base, scale, fps, level)
+    bpp = bytes_per_pixel(trial, input_video, duration, on_process)
+    scale, fps = fit(base, settings.fps, budget / (bpp * duration))
+
+    with Workspace("target_", target_bytes) as workspace:
+        trial_gif = workspace.file("trial.gif")
+        for attempt in range(MAX_FULL_ENCODES):
+            trial = scaled(settings, base, scale, fps, level)
+            if on_status:
+                on_status(f"Encoding {trial.width}x{trial.height} at {fps} fps (attempt {attempt + 1})...")
+            convert(trial, input_video, trial_gif, on_progress=on_progress, on_process=on_process,
+                    on_stage=on_stage)
+            size = os.path.getsize(trial_gif)
+            if size <= target_bytes:
+                with atomic_output(output_gif) as partial_gif:
+                    # The workspace may be on another filesystem, e.g. /dev/shm
+                    shutil.move(trial_gif, partial_gif)
+                return trial
+            if scale <= MIN_SCALE:
+                break
+            scale = max(MIN_SCALE, scale * (target_bytes * SAFETY_MARGIN / size) ** 0.5)
+    raise ValueError(f"Could not fit the GIF under {target_bytes / 1024 ** 2:.1f} MB")
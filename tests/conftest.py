@@ -0,0 +1,39 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the metadata, palette and result caches of test runs out of the user's cache
+os.environ.setdefault("VIDEO_TO_GIF_CACHE_DIR", tempfile.mkdtemp(prefix="video_to_gif_tests_"))
+
+requires_ffmpeg = pytest.mark.skipif(not (shutil.which("ffmpeg") and shutil.which("ffprobe")),
+                                     reason="ffmpeg and ffprobe must be on PATH")
+
+def make_clip(path, source="testsrc2", size="320x240", rate=30, duration=2, codec="libx264"):
+    """Write a synthetic clip with ffmpeg's lavfi sources"""
+    cmd = ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f'{source}=size={size}:rate={rate}:duration={duration}',
+           '-c:v', codec, '-pix_fmt', 'yuv420p', '-y', str(path)]
+    subprocess.run(cmd, check=True)
+    return str(path)
+
+def decode_gif(path):
+    """Composited RGB frames and their delays in milliseconds, as Pillow plays them"""
+    Image = pytest.importorskip("PIL.Image")
+    np = pytest.importorskip("numpy")
+    frames, delays = [], []
+    with Image.open(path) as image:
+        for index in range(image.n_frames):
+            image.seek(index)
+            frames.append(np.array(image.convert("RGB")))
+            delays.append(image.info["duration"])
+    return frames, delays
+
+@pytest.fixture(scope="session")
+def clip(tmp_path_factory):
+    """Two seconds of 30 fps h264"""
+    return make_clip(tmp_path_factory.mktemp("clips") / "clip.mp4")
@@ -0,0 +1,16 @@
+from benchmark import case_id, compare
+
+CASE = {"source": "720p30-10s", "width": "480", "height": "360", "fps": 10, "crop": False, "trim": "full",
+        "mode": "two-pass"}
+
+def test_case_id_fills_in_settings_older_results_lack():
+    result = {**CASE, "frame_diff": "on", "profile": "quality", "adaptive_fps": "off", "segment_trim": "on",
+              "encoder": "ffmpeg"}
+    assert case_id(result) == case_id(CASE)
+    assert case_id({**result, "profile": "speed"}) != case_id(CASE)
+
+def test_compare_flags_regressions_against_an_older_baseline():
+    baseline = {"results": [{**CASE, "wall_time": 10.0, "output_bytes": 1000}]}
+    results = [{**CASE, "profile": "quality", "wall_time": 12.0, "output_bytes": 1000}]
+    regressions = compare(results, baseline, 0.1)
+    assert len(regressions) == 1 and "wall_time: 10.0 -> 12.0" in regressions[0]
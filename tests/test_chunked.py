@@ -0,0 +1,41 @@
+import numpy as np
+
+from chunked import convert_chunked
+from conftest import decode_gif, make_clip, requires_ffmpeg
+from converter import ConversionSettings
+from gif_encoder import delta_block, gif_header, image_block
+from gif_join import join_gifs
+
+def write_gif(path, palette, blocks, width, height):
+    with open(path, "wb") as out:
+        out.write(gif_header(width, height, palette) + b"".join(blocks) + b"\x3B")
+
+def test_join_gifs_keeps_each_parts_colours(tmp_path):
+    red, blue = np.zeros((256, 3), dtype=np.uint8), np.zeros((256, 3), dtype=np.uint8)
+    red[1] = (255, 0, 0)
+    blue[1] = (0, 0, 255)
+    indices = np.zeros((16, 16), dtype=np.uint8)
+    indices[4:12, 4:12] = 1
+    moved = np.roll(indices, 2, axis=1)
+    write_gif(tmp_path / "a.gif", red, [image_block(indices.tobytes(), 0, 0, 16, 16, 10),
+                                        delta_block(indices, moved, 20)], 16, 16)
+    write_gif(tmp_path / "b.gif", blue, [image_block(indices.tobytes(), 0, 0, 16, 16, 30)], 16, 16)
+
+    join_gifs([str(tmp_path / "a.gif"), str(tmp_path / "b.gif")], str(tmp_path / "out.gif"))
+    frames, delays = decode_gif(tmp_path / "out.gif")
+    assert delays == [100, 200, 300]
+    assert np.array_equal(frames[0], red[indices])
+    assert np.array_equal(frames[1], red[moved])
+    assert np.array_equal(frames[2], blue[indices])
+    # Looping is declared once, at the start
+    assert (tmp_path / "out.gif").read_bytes().count(b"NETSCAPE2.0") == 1
+
+@requires_ffmpeg
+def test_chunks_join_into_the_whole_clip(tmp_path):
+    source = make_clip(tmp_path / "clip.mp4", size="160x120", rate=25, duration=10)
+    output = tmp_path / "out.gif"
+    settings = ConversionSettings(width=80, fps=10, cache_result=False)
+    convert_chunked(settings, source, str(output), chunks=2)
+    frames, delays = decode_gif(output)
+    assert frames[0].shape == (60, 80, 3)
+    assert sum(delays) == 10000
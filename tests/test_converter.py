@@ -0,0 +1,23 @@
+from conftest import decode_gif, make_clip, requires_ffmpeg
+from converter import ConversionSettings, convert
+
+pytestmark = requires_ffmpeg
+
+def test_adaptive_fps_leaves_moving_frames_unchanged(clip, tmp_path):
+    outputs = []
+    for adaptive_fps in (False, True):
+        output = tmp_path / f"adaptive_{adaptive_fps}.gif"
+        convert(ConversionSettings(width=160, fps=10, adaptive_fps=adaptive_fps, cache_result=False), clip,
+                str(output))
+        outputs.append(output.read_bytes())
+    # testsrc2 moves in every frame, so nothing is dropped and the pixels must not change either
+    assert outputs[0] == outputs[1]
+
+def test_adaptive_fps_holds_static_frames(tmp_path):
+    source = make_clip(tmp_path / "static.mp4", source="smptehdbars", duration=4)
+    output = tmp_path / "out.gif"
+    convert(ConversionSettings(width=160, fps=10, adaptive_fps=True, min_fps=2, cache_result=False), source,
+            str(output))
+    frames, delays = decode_gif(output)
+    assert len(frames) == 8
+    assert sum(delays) == 4000
@@ -0,0 +1,37 @@
+import subprocess
+
+import pytest
+
+from conftest import make_clip, requires_ffmpeg
+from converter import ConversionSettings, convert
+from decode import PROFILE_NAMES, decode_tuning
+
+pytestmark = requires_ffmpeg
+
+@pytest.mark.parametrize("profile", PROFILE_NAMES)
+def test_tuned_decoder_options_are_accepted_by_ffmpeg(clip, profile):
+    # 30 fps in, 10 fps out: every profile's frame skipping and scaler applies
+    settings = ConversionSettings(width=80, fps=10, profile=profile)
+    tuning = decode_tuning(settings, clip)
+    cmd = ['ffmpeg', '-v', 'error'] + tuning.input_options + [
+        '-i', clip, '-vf', f'fps=10,scale=80:-1:flags={tuning.scale_flags}', '-f', 'null', '-'
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+def test_skip_frame_and_loop_filter_options_for_h264(clip):
+    options = decode_tuning(ConversionSettings(width=80, fps=10, profile="speed"), clip).input_options
+    assert options[options.index('-skip_frame') + 1] == 'noref'
+    assert '-skip_loop_filter' in options
+
+def test_lowres_decoding_of_mpeg4(tmp_path):
+    source = make_clip(tmp_path / "clip.avi", size="640x480", codec="mpeg4")
+    settings = ConversionSettings(width=80, fps=10, profile="speed", cache_result=False)
+    assert '-lowres' in decode_tuning(settings, source).input_options
+    convert(settings, source, str(tmp_path / "out.gif"))
+    assert (tmp_path / "out.gif").stat().st_size > 0
+
+@pytest.mark.parametrize("profile", PROFILE_NAMES)
+def test_convert_with_each_profile(clip, tmp_path, profile):
+    output = tmp_path / "out.gif"
+    convert(ConversionSettings(width=80, fps=10, profile=profile, cache_result=False), clip, str(output))
+    assert output.read_bytes()[:6] == b"GIF89a"
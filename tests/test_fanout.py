@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from conftest import decode_gif, requires_ffmpeg
+from converter import ConversionSettings
+from fanout import convert_variants, parse_variant, variant_output
+
+def test_variant_specs():
+    settings = ConversionSettings(width=480, fps=12)
+    variant = parse_variant(settings, "1080x1920@15/608:1080:656:0")
+    assert (variant.width, variant.height, variant.fps, variant.crop) == (1080, 1920, 15, (608, 1080, 656, 0))
+    assert parse_variant(settings, "x360").width is None
+    assert variant_output("out/clip.gif", parse_variant(settings, "320x")) == "out/clip_320x_12fps.gif"
+    with pytest.raises(ValueError):
+        parse_variant(settings, "x")
+
+@requires_ffmpeg
+@pytest.mark.parametrize("mode", ["Single-pass", "Two-pass"])
+def test_one_gif_per_variant(clip, tmp_path, mode):
+    settings = ConversionSettings(width=160, fps=10, encoding_mode=mode, cache_result=False)
+    specs = {"160x": (160, 120, 10), "80x60@5": (80, 60, 5), "x48/160:120:0:0": (64, 48, 10)}
+    variants = [parse_variant(settings, spec) for spec in specs]
+    outputs = [variant_output(str(tmp_path / "clip.gif"), variant) for variant in variants]
+    assert len(set(outputs)) == len(outputs)
+
+    assert convert_variants(variants, clip, outputs) == outputs
+    for output, (width, height, fps) in zip(outputs, specs.values()):
+        frames, delays = decode_gif(output)
+        # Two seconds of the clip at each variant's own size and rate
+        assert frames[0].shape == (height, width, 3)
+        assert len(frames) == 2 * fps
+        assert sum(delays) == 2000
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(os.path.basename(output) for output in outputs)
@@ -0,0 +1,91 @@
+import subprocess
+
+import numpy as np
+import pytest
+
+from conftest import decode_gif, requires_ffmpeg
+from gif_encoder import (TRANSPARENT_INDEX, build_lut, delta_block, gif_header, image_block, load_palette,
+                         palette_colors, quantize, stream_encode)
+
+def padded_palette(colors, padding):
+    """RGBA palette laid out as palettegen writes it: colours, unused slots, then the transparent slot"""
+    rgba = np.zeros((256, 4), dtype=np.uint8)
+    rgba[:len(colors), :3] = colors
+    rgba[:len(colors), 3] = 255
+    if padding == "repeat":
+        rgba[len(colors):TRANSPARENT_INDEX] = rgba[len(colors) - 1]
+    rgba[TRANSPARENT_INDEX] = (0, 255, 0, 0)
+    return rgba
+
+@pytest.mark.parametrize("padding", ["zeros", "repeat"])
+def test_unused_palette_slots_are_not_candidates(padding):
+    colors = [(40, 40, 40), (200, 30, 30), (250, 250, 250)]
+    rgba = padded_palette(colors, padding)
+    assert palette_colors(rgba) == 3
+    lut = build_lut(np.ascontiguousarray(rgba[:, :3]), palette_colors(rgba))
+    frame = np.array([[[6, 6, 6], [190, 40, 40], [255, 255, 255]]], dtype=np.uint8)
+    # Near-black maps to the darkest real colour, not to a zero-filled slot
+    assert quantize(frame, lut).tolist() == [[0, 1, 2]]
+
+def test_full_palette_keeps_every_colour_but_transparency():
+    rgba = padded_palette([(i, 255 - i, i // 2) for i in range(TRANSPARENT_INDEX)], "zeros")
+    assert palette_colors(rgba) == TRANSPARENT_INDEX
+
+def write_gif(path, palette, blocks, width, height):
+    with open(path, "wb") as out:
+        out.write(gif_header(width, height, palette) + b"".join(blocks) + b"\x3B")
+
+def test_lzw_round_trip(tmp_path):
+    rng = np.random.default_rng(1)
+    palette = rng.integers(0, 256, (256, 3), dtype=np.uint8)
+    # Random indices fill the code table several times over, so clear codes are exercised
+    indices = rng.integers(0, TRANSPARENT_INDEX, (150, 200), dtype=np.uint8)
+    write_gif(tmp_path / "out.gif", palette, [image_block(indices.tobytes(), 0, 0, 200, 150, 7)], 200, 150)
+    frames, delays = decode_gif(tmp_path / "out.gif")
+    assert delays == [70]
+    assert np.array_equal(frames[0], palette[indices])
+
+def test_delta_blocks_composite_to_each_frame(tmp_path):
+    rng = np.random.default_rng(2)
+    palette = rng.integers(0, 256, (256, 3), dtype=np.uint8)
+    first = rng.integers(0, 8, (48, 64), dtype=np.uint8)
+    second = first.copy()
+    second[10:20, 30:50] = rng.integers(0, 8, (10, 20), dtype=np.uint8)
+    third = second.copy()
+    third[40, 5] = (third[40, 5] + 1) % 8
+    assert delta_block(first, first, 10) is None
+
+    blocks = [image_block(first.tobytes(), 0, 0, 64, 48, 10), delta_block(first, second, 20),
+              delta_block(second, third, 30)]
+    write_gif(tmp_path / "out.gif", palette, blocks, 64, 48)
+    frames, delays = decode_gif(tmp_path / "out.gif")
+    assert delays == [100, 200, 300]
+    for frame, indices in zip(frames, [first, second, third]):
+        assert np.array_equal(frame, palette[indices])
+
+@requires_ffmpeg
+@pytest.mark.parametrize("frame_diff", [True, False])
+def test_stream_encode_matches_quantised_frames(tmp_path, frame_diff):
+    # testsrc2 at 5 fps sampled at 10 fps repeats every frame once
+    source = ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=64x48:rate=5:duration=2",
+              "-vf", "fps=10"]
+    palette_file = tmp_path / "palette.png"
+    subprocess.run(source + ["-vf", "palettegen", "-y", str(palette_file)], check=True)
+    frame_cmd = source + ["-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+    raw = subprocess.run(frame_cmd, check=True, capture_output=True).stdout
+    expected = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 48, 64, 3)
+    assert len(expected) == 20
+
+    output = tmp_path / "out.gif"
+    frames_read = stream_encode(frame_cmd, 64, 48, 10, str(palette_file), str(output), workers=2,
+                                frame_diff=frame_diff)
+    assert frames_read == 20
+    palette, colors = load_palette(str(palette_file))
+    lut = build_lut(palette, colors)
+    frames, delays = decode_gif(output)
+    assert sum(delays) == 2000
+    # Identical frames are merged into one frame with the summed delay when diffing
+    assert delays == ([200] * 10 if frame_diff else [100] * 20)
+    shown = expected[::2] if frame_diff else expected
+    for frame, source_frame in zip(frames, shown):
+        assert np.array_equal(frame, palette[quantize(source_frame, lut)])
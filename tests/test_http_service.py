@@ -0,0 +1,107 @@
+import asyncio
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import http_service
+from conftest import requires_ffmpeg
+from http_service import ConversionService
+
+@pytest.fixture
+def service(tmp_path):
+    """A ConversionService listening on a free local port, served from a background event loop"""
+    service = ConversionService(tmp_path / "service", workers=1)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(service.handle, "127.0.0.1", 0))
+    service.port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield service
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    loop.close()
+
+def request(service, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", service.port, timeout=10)
+    if isinstance(body, dict):
+        body = json.dumps(body).encode()
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    if response.getheader("Content-Type") == "application/json":
+        data = json.loads(data)
+    return response.status, data
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"not decoded by these tests")
+    return str(path)
+
+@pytest.mark.parametrize("fields, message", [
+    ({"frame_diff": "false"}, "frame_diff must be true or false"),
+    ({"width": "320"}, "width must be an integer"),
+    ({"width": 320.5}, "width must be an integer"),
+    ({"width": 0}, "Width and height must be positive integers"),
+    ({"max_colors": None}, "max_colors must be an integer"),
+    ({"crop": 5}, "crop must be [width, height, x, y]"),
+    ({"cache": "no"}, "cache must be true or false"),
+    ({"encoding_mode": "Three-pass"}, "Unknown encoding mode: Three-pass"),
+])
+def test_invalid_fields_are_rejected(service, video, fields, message):
+    status, body = request(service, "POST", "/jobs", {"input": video, **fields})
+    assert (status, body) == (400, {"error": message})
+    assert not service.queue.jobs
+
+def test_malformed_requests(service, video):
+    assert request(service, "POST", "/jobs", b"{")[0] == 400
+    assert request(service, "POST", "/jobs", b"[1]")[0] == 400
+    assert request(service, "POST", "/jobs", {"input": 5})[1] == {"error": "input must be a string"}
+    assert request(service, "POST", "/jobs", {})[0] == 400
+    assert request(service, "POST", "/jobs", {"input": video + ".missing"})[0] == 400
+
+def test_unknown_resources(service):
+    assert request(service, "POST", "/jobs", {"upload": "missing"}) == (404, {"error": "No such upload"})
+    assert request(service, "GET", "/jobs/999")[0] == 404
+    assert request(service, "DELETE", "/uploads/missing")[0] == 404
+    assert request(service, "GET", "/nothing")[0] == 404
+
+def test_oversized_upload_is_refused(service, monkeypatch):
+    monkeypatch.setattr(http_service, "MAX_UPLOAD_BYTES", 16)
+    status, body = request(service, "POST", "/uploads?name=clip.mp4", b"x" * 17)
+    assert status == 413
+    assert not list(service.upload_dir.iterdir())
+
+def test_idle_uploads_are_pruned(service, monkeypatch):
+    status, body = request(service, "POST", "/uploads?name=clip.mp4", b"x" * 16)
+    assert status == 201
+    path = service.uploads[body["upload"]]
+    monkeypatch.setattr(http_service, "UPLOAD_IDLE_SECONDS", 0)
+    request(service, "GET", "/jobs")
+    assert body["upload"] not in service.uploads
+    assert not service.upload_dir.joinpath(path).exists()
+
+@requires_ffmpeg
+def test_upload_convert_download_delete(service, clip):
+    with open(clip, "rb") as f:
+        status, upload = request(service, "POST", "/uploads?name=clip.mp4", f.read())
+    assert status == 201
+    status, job = request(service, "POST", "/jobs", {"upload": upload["upload"], "width": 80, "fps": 5,
+                                                     "cache": False})
+    assert status == 201
+    deadline = time.monotonic() + 60
+    while job["status"] in ("Pending", "Running") and time.monotonic() < deadline:
+        time.sleep(0.1)
+        job = request(service, "GET", f"/jobs/{job['id']}")[1]
+    assert job["status"] == "Done", job["message"]
+    status, gif = request(service, "GET", f"/jobs/{job['id']}/result")
+    assert status == 200 and gif[:6] == b"GIF89a"
+    assert request(service, "DELETE", f"/jobs/{job['id']}")[0] == 200
+    assert not service.queue.jobs
+    assert request(service, "GET", f"/jobs/{job['id']}")[0] == 404
@@ -0,0 +1,17 @@
+import metadata
+from converter import ConversionSettings
+from result_cache import normalized_settings
+
+def test_fixed_palette_is_keyed_without_probing(tmp_path, monkeypatch):
+    def no_probe():
+        raise AssertionError("the palette must not be probed")
+
+    monkeypatch.setattr(metadata, "get_store", no_probe)
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"palette one")
+    second.write_bytes(b"palette one")
+    key = normalized_settings(ConversionSettings(palette=str(first)))["palette"]
+    # The same palette at another path gives the same key; different contents do not
+    assert normalized_settings(ConversionSettings(palette=str(second)))["palette"] == key
+    second.write_bytes(b"palette two")
+    assert normalized_settings(ConversionSettings(palette=str(second)))["palette"] != key
@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import supervisor
+from converter import run_ffmpeg
+from supervisor import CancelToken, ProcessLimits, StageTimeout
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="the fake ffmpeg is a shell script")
+
+# Stands in for ffmpeg: starts a grandchild, then reports progress as ffmpeg -progress does
+FAKE_FFMPEG = """#!/bin/sh
+sleep 60 &
+echo $! > "{pid_file}"
+frame=0
+while [ $frame -lt {reports} ]; do
+    frame=$((frame + 1))
+    printf 'frame=%d\\nout_time_us=%d\\nprogress=continue\\n' $frame $((frame * 100000))
+    sleep 0.1
+done
+sleep 60
+"""
+
+def fake_ffmpeg(tmp_path, reports):
+    script = tmp_path / "ffmpeg"
+    pid_file = tmp_path / "child.pid"
+    script.write_text(FAKE_FFMPEG.format(pid_file=pid_file, reports=reports))
+    script.chmod(0o755)
+    return [str(script)], pid_file
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A zombie still answers kill(0) until it is reaped by init
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(") ")[1][0] != "Z"
+    except OSError:
+        return True
+
+def wait_dead(pid, timeout=5):
+    deadline = time.monotonic() + timeout
+    while alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not alive(pid)
+
+def run(cmd, limits, **kwargs):
+    processes = []
+    started = time.monotonic()
+    with pytest.raises(Exception) as raised:
+        run_ffmpeg(cmd, "Creating GIF...", limits=limits, on_process=processes.append, **kwargs)
+    return raised.value, processes[0], time.monotonic() - started
+
+def test_timeout_kills_the_process_group(tmp_path):
+    cmd, pid_file = fake_ffmpeg(tmp_path, reports=1000)
+    error, process, elapsed = run(cmd, ProcessLimits(timeout=1.5))
+    assert isinstance(error, StageTimeout)
+    assert "timed out" in str(error)
+    assert elapsed < 5
+    assert process.returncode is not None
+    assert wait_dead(int(pid_file.read_text()))
+
+def test_stall_kills_a_process_that_stops_reporting(tmp_path):
+    cmd, pid_file = fake_ffmpeg(tmp_path, reports=3)
+    error, process, elapsed = run(cmd, ProcessLimits(stall_timeout=1.5))
+    assert isinstance(error, StageTimeout)
+    assert "no progress" in str(error)
+    assert elapsed < 5
+    assert wait_dead(int(pid_file.read_text()))
+
+def test_failing_callback_reaps_the_process(tmp_path):
+    cmd, pid_file = fake_ffmpeg(tmp_path, reports=1000)
+
+    def on_progress(event):
+        raise RuntimeError("progress handler failed")
+
+    error, process, _ = run(cmd, ProcessLimits(stall_timeout=1), on_progress=on_progress)
+    assert isinstance(error, RuntimeError)
+    # Reaped, untracked, and no watchdog left running to signal the pid later
+    assert process.returncode is not None
+    assert process not in supervisor._live
+    assert not [thread for thread in threading.enumerate() if thread.name.endswith("(_watch)")]
+    assert wait_dead(int(pid_file.read_text()))
+
+def test_cancel_token_kills_running_process(tmp_path):
+    cmd, pid_file = fake_ffmpeg(tmp_path, reports=1000)
+    token = CancelToken()
+    threading.Timer(0.5, token.cancel).start()
+    with pytest.raises(Exception):
+        run_ffmpeg(cmd, "Creating GIF...", on_process=token.attach)
+    assert token.cancelled
+    assert wait_dead(int(pid_file.read_text()))
+
+def test_attach_after_cancel_kills_immediately():
+    token = CancelToken()
+    token.cancel()
+    process = supervisor.popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        token.attach(process)
+        assert process.wait(timeout=5) != 0
+    finally:
+        supervisor.release(process)
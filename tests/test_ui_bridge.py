@@ -0,0 +1,86 @@
+import heapq
+import itertools
+import threading
+import time
+
+from ui_bridge import UIBridge
+
+# Longest the fake main loop may go without running a callback while a probe is busy
+MAX_GAP_SECONDS = 0.1
+
+class FakeRoot:
+    """Stands in for Tk: runs after() callbacks on the calling thread and records when each ran"""
+
+    def __init__(self):
+        self._timers = []
+        self._ids = itertools.count()
+        self.ran_at = []
+        self.thread = None
+
+    def after(self, ms, callback):
+        timer_id = next(self._ids)
+        heapq.heappush(self._timers, (time.monotonic() + ms / 1000, timer_id, callback))
+        return timer_id
+
+    def after_cancel(self, timer_id):
+        self._timers = [timer for timer in self._timers if timer[1] != timer_id]
+        heapq.heapify(self._timers)
+
+    def run_until(self, done, timeout):
+        self.thread = threading.current_thread()
+        deadline = time.monotonic() + timeout
+        while not done() and time.monotonic() < deadline and self._timers:
+            due, _, callback = heapq.heappop(self._timers)
+            time.sleep(max(0.0, due - time.monotonic()))
+            self.ran_at.append(time.monotonic())
+            callback()
+
+def slow_probe(path):
+    time.sleep(0.5)
+    return {"path": path, "duration": 12.5}
+
+def test_slow_probe_does_not_stall_main_loop():
+    root = FakeRoot()
+    bridge = UIBridge(root)
+    results = []
+    callback_threads = []
+
+    def on_done(info):
+        callback_threads.append(threading.current_thread())
+        results.append(info)
+
+    def on_progress(percent):
+        callback_threads.append(threading.current_thread())
+
+    def progress_burst():
+        # More events than one drain handles, as a fast ffmpeg -progress stream produces
+        for percent in range(2000):
+            bridge.post(on_progress, percent)
+
+    try:
+        bridge.submit(bridge.probe_pool, slow_probe, "clip.mp4", on_done=on_done)
+        bridge.submit(bridge.conversion_pool, progress_burst)
+        root.run_until(lambda: results, timeout=5)
+    finally:
+        bridge.shutdown()
+
+    assert results == [{"path": "clip.mp4", "duration": 12.5}]
+    assert all(thread is root.thread for thread in callback_threads)
+    gaps = [later - earlier for earlier, later in zip(root.ran_at, root.ran_at[1:])]
+    assert max(gaps) < MAX_GAP_SECONDS
+
+def test_errors_are_delivered_on_main_loop():
+    root = FakeRoot()
+    bridge = UIBridge(root)
+    errors = []
+
+    def fail():
+        raise RuntimeError("ffprobe failed")
+
+    try:
+        bridge.submit(bridge.probe_pool, fail, on_error=errors.append)
+        root.run_until(lambda: errors, timeout=5)
+    finally:
+        bridge.shutdown()
+
+    assert [str(error) for error in errors] == ["ffprobe failed"]
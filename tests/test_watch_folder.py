@@ -0,0 +1,99 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import watch_folder
+from conftest import requires_ffmpeg
+from job_queue import FAILED
+from watch_folder import FolderWatcher, ProcessedRecord
+
+def identity(path):
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+def test_growing_file_is_queued_once_it_settles(tmp_path, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(watch_folder, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    watcher = FolderWatcher([tmp_path], workers=1, record=ProcessedRecord(str(tmp_path / "record.sqlite")),
+                            settle=5)
+    submitted = []
+    watcher.submit = lambda path, identity: submitted.append(path)
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"first part")
+    watcher.candidates[str(video)] = None
+
+    def settle_at(seconds):
+        clock[0] = seconds
+        watcher.settle_candidates()
+
+    settle_at(0)
+    settle_at(3)
+    with open(video, "ab") as f:
+        f.write(b" still being copied")
+    settle_at(6)
+    # Five seconds have passed since it was first seen, but not since it last grew
+    settle_at(10)
+    assert not submitted
+    settle_at(11)
+    assert submitted == [str(video)]
+    settle_at(20)
+    assert submitted == [str(video)]
+
+def test_empty_file_is_not_queued(tmp_path, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(watch_folder, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    watcher = FolderWatcher([tmp_path], workers=1, record=ProcessedRecord(str(tmp_path / "record.sqlite")),
+                            settle=0)
+    watcher.submit = lambda path, identity: pytest.fail("an empty file was queued")
+    video = tmp_path / "clip.mp4"
+    video.touch()
+    watcher.candidates[str(video)] = None
+    for clock[0] in (0, 10, 20):
+        watcher.settle_candidates()
+
+def test_earlier_failures_are_retried_once(tmp_path):
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"x")
+    record_path = str(tmp_path / "record.sqlite")
+    settings = watch_folder.ConversionSettings()
+    ProcessedRecord(record_path).mark(str(video), identity(video), FAILED, None, "bad", settings)
+
+    record = ProcessedRecord(record_path)
+    assert record.finished(str(video), identity(video))
+    assert not record.finished(str(video), identity(video), retry_failed=True)
+    # Failing again in this run settles it until the file changes
+    record.mark(str(video), identity(video), FAILED, None, "bad", settings)
+    assert record.finished(str(video), identity(video), retry_failed=True)
+    assert not record.finished(str(video), (2, 0), retry_failed=True)
+
+@requires_ffmpeg
+def test_watcher_retries_a_failed_file_once(tmp_path):
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"not a video")
+    record_path = str(tmp_path / "record.sqlite")
+    ProcessedRecord(record_path).mark(str(video), identity(video), FAILED, None, "bad",
+                                      watch_folder.ConversionSettings())
+    watcher = FolderWatcher([tmp_path], workers=1, record=ProcessedRecord(record_path), settle=0,
+                            retry_failed=True)
+    submitted = []
+    submit = watcher.submit
+
+    def record_submit(path, identity):
+        submitted.append(path)
+        submit(path, identity)
+
+    watcher.submit = record_submit
+    try:
+        for _ in range(2):
+            watcher.candidates[str(video)] = None
+            watcher.settle_candidates()
+            watcher.settle_candidates()
+            deadline = time.monotonic() + 30
+            while watcher.active and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert not watcher.active
+    finally:
+        watcher.stop()
+    assert submitted == [str(video)]
+    assert watcher.record.finished(str(video), identity(video), retry_failed=True)
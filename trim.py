@@ -0,0 +1,132 @@
+import bisect
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from dataclasses import replace
+
+from binaries import get_binary
+from cache import user_cache_dir
+from metadata import source_identity
+
+KEYFRAME_DIR = "keyframes"
+# Seconds scanned around the trim window when looking for keyframes
+KEYFRAME_SEARCH = 30
+# Copied past the stop time when no later keyframe is known, so reordered frames keep their references
+STOP_MARGIN = 1.0
+
+_lock = threading.Lock()
+
+class KeyframeIndex:
+    """Keyframe timestamps of one source, scanned by time range and cached on disk"""
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        identity = json.dumps(source_identity(video_path))
+        self.path = str(user_cache_dir(KEYFRAME_DIR) / f"{hashlib.sha256(identity.encode()).hexdigest()}.json")
+        self.ranges = []
+        self.keyframes = []
+        self._load()
+
+    def window(self, start, stop=None):
+        """Keyframes at or before start and at or after stop (None if not found)"""
+        low = max(0, start - KEYFRAME_SEARCH)
+        high = (stop if stop is not None else start) + KEYFRAME_SEARCH
+        if not self._covered(low, high):
+            self._scan(low, high)
+
+        i = bisect.bisect_right(self.keyframes, start)
+        before = self.keyframes[i - 1] if i and self.keyframes[i - 1] >= low else None
+        after = None
+        if stop is not None:
+            j = bisect.bisect_left(self.keyframes, stop)
+            after = self.keyframes[j] if j < len(self.keyframes) and self.keyframes[j] <= high else None
+        return before, after
+
+    def _covered(self, low, high):
+        return any(a <= low and high <= b for a, b in self.ranges)
+
+    def _scan(self, low, high):
+        """List keyframe packets in [low, high] without decoding anything"""
+        cmd = [
+            get_binary("ffprobe"), '-v', 'error', '-select_streams', 'v:0',
+            '-read_intervals', f'{low}%{high}',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', self.video_path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        found = set(self.keyframes)
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags:
+                try:
+                    found.add(float(pts_time))
+                except ValueError:
+                    continue
+        self.keyframes = sorted(found)
+        self.ranges = _merge_ranges(self.ranges + [[low, high]])
+        self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.ranges = data['ranges']
+            self.keyframes = data['keyframes']
+        except (OSError, ValueError, KeyError):
+            self.ranges, self.keyframes = [], []
+
+    def _save(self):
+        with _lock:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({'ranges': self.ranges, 'keyframes': self.keyframes}, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+def _merge_ranges(ranges):
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+def segment_window(settings, video_path):
+    """Keyframe-aligned (start, stop) covering the trim, or None if it cannot be aligned
+
+    Open-ended trims are not segmented: the copy would run to the end of the
+    source and cost more I/O than the input seek it saves.
+    """
+    if not settings.start_time or settings.stop_time is None:
+        return None
+    try:
+        start, stop = KeyframeIndex(video_path).window(settings.start_time, settings.stop_time)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    if start is None:
+        return None
+    if stop is None:
+        stop = settings.stop_time + STOP_MARGIN
+    return start, stop
+
+def build_segment_command(video_path, segment_file, start, stop):
+    """Copy the keyframe-aligned window into a segment without re-encoding"""
+    return [
+        get_binary("ffmpeg"), '-ss', str(start), '-to', str(stop),
+        '-i', video_path, '-map', '0:v:0', '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero', '-y', segment_file
+    ]
+
+def segment_settings(settings, segment_start):
+    """Settings with the trim shifted to be relative to a segment starting at segment_start"""
+    return replace(
+        settings,
+        start_time=settings.start_time - segment_start,
+        stop_time=settings.stop_time - segment_start if settings.stop_time is not None else None,
+    )
@@ -0,0 +1,78 @@
+import queue
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import TclError
+
+# Milliseconds between checks of the event queue on the Tk thread
+POLL_INTERVAL_MS = 30
+# Callbacks run per check, so a burst of progress events cannot starve redraws and input
+MAX_CALLBACKS_PER_POLL = 200
+
+class UIBridge:
+    """Run background work in executors and hand results to the Tk thread through a queue
+
+    Tk must only be touched from the thread running mainloop. Worker threads
+    call post(), which only puts onto a thread-safe queue; the Tk thread drains
+    it on a root.after timer, so the main loop never waits on a worker or a
+    subprocess.
+    """
+
+    def __init__(self, root, poll_ms=POLL_INTERVAL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._events = queue.SimpleQueue()
+        # ffprobe calls and directory listings: short, but slow on network shares
+        self.probe_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="probe")
+        # Preview strips; a newer request supersedes older ones, so one worker is enough
+        self.thumbnail_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnail")
+        # Single conversions and batch preparation such as shared palettes
+        self.conversion_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="conversion")
+        self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the Tk thread; safe to call from any thread"""
+        self._events.put((callback, args))
+
+    def submit(self, executor, fn, *args, on_done=None, on_error=None):
+        """Run fn(*args) on executor, then on_done(result) or on_error(exception) on the Tk thread"""
+        future = executor.submit(fn, *args)
+
+        def finished(future):
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                if on_done:
+                    self.post(on_done, future.result())
+            elif on_error:
+                self.post(on_error, error)
+            else:
+                traceback.print_exception(type(error), error, error.__traceback__)
+
+        future.add_done_callback(finished)
+        return future
+
+    def _drain(self):
+        for _ in range(MAX_CALLBACKS_PER_POLL):
+            try:
+                callback, args = self._events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                # One failing callback must not stop delivery of the rest
+                traceback.print_exc()
+        self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def shutdown(self):
+        """Stop polling and drop work that has not started"""
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except TclError:
+                # The window is already destroyed
+                pass
+            self._after_id = None
+        for pool in (self.probe_pool, self.thumbnail_pool, self.conversion_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,188 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from chunked import convert_chunked
+from converter import (ConversionSettings, convert, DEFAULT_FRAMERATE, DEFAULT_MAX_COLORS, DEFAULT_MIN_FPS,
+                       DEFAULT_MOTION_THRESHOLD, DITHER_MODES, ENCODERS, ENCODING_MODES)
+from decode import PROFILE_NAMES
+from fanout import convert_variants, parse_variant, variant_output
+from job_queue import collect_videos
+from metadata import get_store
+from palette import build_shared_palette
+from target_size import convert_to_size, parse_size
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(prog="video-to-gif", description="Convert videos to GIF files")
+    parser.add_argument("inputs", nargs="+",
+                        help="video files, directories or glob patterns (e.g. 'clips/*.mp4')")
+    parser.add_argument("-o", "--output",
+                        help="output GIF for a single input, or output directory for several")
+    parser.add_argument("--width", default="", help="output width, omit to keep the aspect ratio")
+    parser.add_argument("--height", default="", help="output height, omit to keep the aspect ratio")
+    parser.add_argument("--fps", default=str(DEFAULT_FRAMERATE), help="output framerate")
+    parser.add_argument("--start", default="", help="start time: HH:MM:SS, MM:SS, or seconds")
+    parser.add_argument("--stop", default="", help="stop time: HH:MM:SS, MM:SS, or seconds")
+    parser.add_argument("--crop", metavar="W:H:X:Y", help="crop rectangle before scaling")
+    parser.add_argument("--mode", default="auto", choices=[m.lower() for m in ENCODING_MODES],
+                        help="palette encoding mode")
+    parser.add_argument("--max-colors", type=int, default=DEFAULT_MAX_COLORS, help="palette size (2-256)")
+    parser.add_argument("--dither", default=DITHER_MODES[0], choices=DITHER_MODES, help="paletteuse dithering")
+    parser.add_argument("--encoder", default=ENCODERS[0], choices=ENCODERS,
+                        help="'streaming' writes the GIF in-process from raw frames (needs numpy)")
+    parser.add_argument("--profile", default=PROFILE_NAMES[0], choices=PROFILE_NAMES,
+                        help="decode profile: faster profiles decode at lower resolution, skip frames "
+                             "and use a cheaper scaler for large reductions")
+    parser.add_argument("--threads", type=int,
+                        help="ffmpeg decoder threads per conversion (default: CPU count divided by --jobs)")
+    parser.add_argument("--no-frame-diff", action="store_true",
+                        help="store every frame in full instead of only the changed rectangle")
+    parser.add_argument("--adaptive-fps", action="store_true",
+                        help="drop near-duplicate frames and show the remaining ones longer")
+    parser.add_argument("--motion-threshold", type=int, default=DEFAULT_MOTION_THRESHOLD,
+                        help="8x8 block difference below which a frame counts as a duplicate; higher drops more")
+    parser.add_argument("--min-fps", type=float, default=DEFAULT_MIN_FPS,
+                        help="adaptive fps keeps at least this many frames per second")
+    parser.add_argument("--target-size", metavar="SIZE",
+                        help="largest allowed GIF size, e.g. 8MB; scale, fps and palette are searched to fit")
+    parser.add_argument("--palette", help="apply this palette PNG instead of generating one")
+    parser.add_argument("--shared-palette", action="store_true",
+                        help="build one palette from samples of all inputs and use it for every GIF")
+    parser.add_argument("--no-palette-cache", action="store_true", help="always regenerate palettes")
+    parser.add_argument("--no-segment-trim", action="store_true",
+                        help="seek the source on every pass instead of copying a deep trim into a segment first")
+    parser.add_argument("--no-result-cache", action="store_true",
+                        help="always encode, even if this source was converted with the same settings before")
+    parser.add_argument("--chunks", type=int, default=1,
+                        help="encode each clip as this many parallel chunks split at scene cuts, 0 for one per CPU")
+    parser.add_argument("--variant", action="append", metavar="WxH[@FPS][/W:H:X:Y]",
+                        help="write one GIF per variant instead, decoding the source once for all of them; "
+                             "repeat for each variant, a preset name such as 360p or story also works")
+    parser.add_argument("--timeout", type=float, help="seconds any single ffmpeg stage may run")
+    parser.add_argument("--cpu-limit", type=int, help="CPU seconds any single ffmpeg process may use (Linux)")
+    parser.add_argument("--memory-limit", metavar="SIZE",
+                        help="address space limit per ffmpeg process, e.g. 2G (Linux)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of parallel conversions (default: CPU count)")
+    return parser.parse_args(argv)
+
+def expand_inputs(patterns):
+    """Expand glob patterns and directories into video files"""
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        paths.extend(sorted(matches) if matches else [pattern])
+    return collect_videos(paths)
+
+def output_for(input_video, output, multiple):
+    """Pick the output path for one input"""
+    if output is None:
+        return str(Path(input_video).with_suffix('.gif'))
+    if multiple or os.path.isdir(output):
+        os.makedirs(output, exist_ok=True)
+        return str(Path(output) / Path(input_video).with_suffix('.gif').name)
+    return output
+
+def convert_one(settings, input_video, output_gif, target_bytes=None, chunks=1, variant_specs=None):
+    """Convert one input, fitting it to target_bytes when given"""
+    if variant_specs:
+        variants = [parse_variant(settings, spec) for spec in variant_specs]
+        outputs = [variant_output(output_gif, variant) for variant in variants]
+        return ", ".join(convert_variants(variants, input_video, outputs))
+    if target_bytes:
+        convert_to_size(settings, input_video, output_gif, target_bytes)
+    elif chunks != 1:
+        convert_chunked(settings, input_video, output_gif, chunks or None)
+    else:
+        convert(settings, input_video, output_gif)
+    return output_gif
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    crop = args.crop.split(":") if args.crop else None
+    if crop is not None and len(crop) != 4:
+        print("error: --crop must be W:H:X:Y", file=sys.stderr)
+        return 2
+    try:
+        settings = ConversionSettings.from_form(
+            args.width, args.height, args.fps, args.start, args.stop, crop, args.mode.capitalize()
+        )
+        settings.max_colors = args.max_colors
+        settings.dither = args.dither
+        settings.encoder = args.encoder
+        settings.frame_diff = not args.no_frame_diff
+        settings.profile = args.profile
+        settings.adaptive_fps = args.adaptive_fps
+        settings.motion_threshold = args.motion_threshold
+        settings.min_fps = args.min_fps
+        settings.threads = args.threads
+        settings.cache_palette = not args.no_palette_cache
+        settings.cache_result = not args.no_result_cache
+        settings.segment_trim = not args.no_segment_trim
+        settings.stage_timeout = args.timeout
+        settings.cpu_limit = args.cpu_limit
+        settings.memory_limit = parse_size(args.memory_limit) if args.memory_limit else None
+        settings.validate()
+        target_bytes = parse_size(args.target_size) if args.target_size else None
+        for spec in args.variant or []:
+            parse_variant(settings, spec)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    if args.variant and (target_bytes or args.chunks != 1 or settings.encoder != "ffmpeg"
+                         or args.palette or args.shared_palette):
+        print("error: --variant cannot be combined with --target-size, --chunks, a fixed palette "
+              "or the streaming encoder", file=sys.stderr)
+        return 2
+
+    videos = expand_inputs(args.inputs)
+    if not videos:
+        print("error: no video files found", file=sys.stderr)
+        return 1
+
+    get_store().get_many(videos, workers=max(1, args.jobs))
+
+    parallel = min(max(1, args.jobs), len(videos))
+    if settings.threads is None and parallel > 1:
+        settings.threads = max(1, (os.cpu_count() or 1) // parallel)
+
+    if args.palette:
+        settings.palette = args.palette
+    elif args.shared_palette:
+        try:
+            settings.palette = build_shared_palette(settings, videos)
+        except subprocess.CalledProcessError as e:
+            print(f"error: shared palette failed with return code {e.returncode}", file=sys.stderr)
+            return 1
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {
+            pool.submit(convert_one, settings, video, output_for(video, args.output, len(videos) > 1),
+                        target_bytes, args.chunks, args.variant): video
+            for video in videos
+        }
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                print(f"{video} -> {future.result()}")
+            except subprocess.CalledProcessError as e:
+                failures += 1
+                print(f"{video}: FFmpeg command failed with return code {e.returncode}", file=sys.stderr)
+            except Exception as e:
+                failures += 1
+                print(f"{video}: {e}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    # The streaming encoder starts worker processes, which frozen builds must support
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,71 +1,56 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import subprocess
+import multiprocessing
 import os
-import threading
 from pathlib import Path
 import atexit
+import base64
+from dataclasses import replace
 from math import ceil
 
-from script_data import FFMPEG_BIN, FFPROBE_BIN, ICON_BIN
-import tempfile
-import shutil
+from binaries import get_binary
+from converter import (ConversionSettings, convert, describe_progress, get_video_dimensions,
+                       parse_time_to_seconds, DEFAULT_ASPECT_RATIO, DEFAULT_RESOLUTION, DEFAULT_FRAMERATE,
+                       ENCODING_MODES, PRESETS)
+from decode import PROFILE_NAMES
+from instrumentation import format_metrics
+from job_queue import JobQueue, collect_videos, PENDING, RUNNING
+from palette import build_shared_palette
+from preview import load_strip, PREVIEW_WIDTH
+from supervisor import CancelToken, kill_all
+from workspace import cleanup_workspaces, remove_path
+from target_size import convert_to_size
+from ui_bridge import UIBridge
 
-FFMPEG_PATH = None
-FFPROBE_PATH = None
-ICON_PATH = None
 TEMP_FILES = []
 
-DEFAULT_ASPECT_RATIO = 16/9
-DEFAULT_RESOLUTION = "420x333"
-DEFAULT_FRAMERATE = 24
+PREVIEW_STRIP_HEIGHT = 40
+PREVIEW_DELAY_MS = 400
+
+VIDEO_FILE_TYPES = [
+    ("Video files", "*.mp4 *.avi *.mov *.mkv *.wmv *.flv *.webm *.m4v"),
+    ("All files", "*.*")
+]
 
 def cleanup_temp_files():
-    """Cleanup temporary binaries"""
+    """Cleanup temporary files and directories"""
     for temp_file in TEMP_FILES:
-        try:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
-        except Exception:
-            pass
-
-atexit.register(cleanup_temp_files)
+        remove_path(temp_file)
 
-def setup_binaries():
-    """Install temporary binaries if doesn't exists"""
-    global FFMPEG_PATH, FFPROBE_PATH, ICON_PATH
-    
-    if shutil.which("ffmpeg.exe"):
-        FFMPEG_PATH = "ffmpeg.exe"
-    else:
-        fd, FFMPEG_PATH = tempfile.mkstemp(suffix='.exe')
-        os.close(fd)
-        with open(FFMPEG_PATH, 'wb') as f:
-            f.write(FFMPEG_BIN)
-        TEMP_FILES.append(FFMPEG_PATH)
-        os.chmod(FFMPEG_PATH, 0o755)
+def shutdown():
+    """Kill running ffmpeg process groups, then remove job workspaces and temporary files"""
+    kill_all()
+    cleanup_workspaces()
+    cleanup_temp_files()
 
-    if shutil.which("ffprobe.exe"):
-        FFPROBE_PATH = "ffprobe.exe"
-    else:
-        fd, FFPROBE_PATH = tempfile.mkstemp(suffix='.exe')
-        os.close(fd)
-        with open(FFPROBE_PATH, 'wb') as f:
-            f.write(FFPROBE_BIN)
-        TEMP_FILES.append(FFPROBE_PATH)
-        os.chmod(FFPROBE_PATH, 0o755)
-
-    fd, ICON_PATH = tempfile.mkstemp(suffix='.ico')
-    os.close(fd)
-    with open(ICON_PATH, 'wb') as f:
-        f.write(ICON_BIN)
-    TEMP_FILES.append(ICON_PATH)
+atexit.register(shutdown)
 
 class VideoToGIFConverter:
     def __init__(self, root):
         self.root = root
         self.root.title("Video to GIF Converter")
-        self.root.geometry("720x600")
+        self.root.geometry("1100x620")
         self.root.resizable(True, True)
         
         self.input_video = tk.StringVar()
@@ -78,6 +63,12 @@ class VideoToGIFConverter:
         self.crop_x = tk.StringVar()
         self.crop_y = tk.StringVar()
         self.use_crop = tk.BooleanVar(value=False)
+        self.encoding_mode = tk.StringVar(value=ENCODING_MODES[0])
+        self.decode_profile = tk.StringVar(value=PROFILE_NAMES[0])
+        self.shared_palette = tk.BooleanVar(value=False)
+        self.adaptive_fps = tk.BooleanVar(value=False)
+        self.target_size = tk.StringVar()
+        self.cancel_token = None
         
         _width,_height = DEFAULT_RESOLUTION.split("x")
         self.width = tk.StringVar(value=_width)
@@ -90,6 +81,18 @@ class VideoToGIFConverter:
 
         self.user_defined_output = False
         
+        self.batch_workers = tk.StringVar(value=str(os.cpu_count() or 1))
+        self.job_queue = None
+        self.batch_window = None
+        self.batch_tree = None
+        
+        self.preview_frames = []
+        self.preview_index = 0
+        self.preview_source_size = None
+        self.preview_token = 0
+        self.preview_after_id = None
+        
+        self.bridge = UIBridge(root)
         self.setup_ui()
         
     def setup_ui(self):
@@ -146,16 +149,7 @@ class VideoToGIFConverter:
         
         ttk.Label(presets_frame, text="Presets:").grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
         
-        presets = [
-            ("360p (480x360)", "480", "360"),
-            ("720p (1280x720)", "1280", "720"),
-            ("1080p (1920x1080)", "1920", "1080"),
-            ("Square (500x500)", "500", "500"),
-            ("Instagram (1080x1350)", "1080", "1350"),
-            ("Story (1080x1920)", "1080", "1920")
-        ]
-        
-        for i, (label, w, h) in enumerate(presets):
+        for i, (label, w, h) in enumerate(PRESETS):
             btn = ttk.Button(presets_frame, text=label, width=15,
                            command=lambda w=w, h=h: self.apply_preset(w, h))
             btn.grid(row=0, column=i+1, padx=(0, 5))
@@ -166,6 +160,23 @@ class VideoToGIFConverter:
         ttk.Label(fps_frame, text="FPS:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
         ttk.Entry(fps_frame, textvariable=self.fps, width=10).grid(row=0, column=1, sticky=tk.W)
         
+        ttk.Label(fps_frame, text="Encoding:").grid(row=0, column=2, sticky=tk.W, padx=(15, 5))
+        ttk.Combobox(fps_frame, textvariable=self.encoding_mode, values=ENCODING_MODES,
+                     state="readonly", width=12).grid(row=0, column=3, sticky=tk.W)
+        ttk.Checkbutton(fps_frame, text="Shared palette for batches",
+                        variable=self.shared_palette).grid(row=0, column=4, sticky=tk.W, padx=(15, 0))
+        ttk.Label(fps_frame, text="Decode:").grid(row=0, column=5, sticky=tk.W, padx=(15, 5))
+        ttk.Combobox(fps_frame, textvariable=self.decode_profile, values=PROFILE_NAMES,
+                     state="readonly", width=10).grid(row=0, column=6, sticky=tk.W)
+        
+        ttk.Label(fps_frame, text="Target size (MB):").grid(row=1, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        ttk.Entry(fps_frame, textvariable=self.target_size, width=10).grid(row=1, column=1, sticky=tk.W, pady=(5, 0))
+        ttk.Label(fps_frame, text="Optional: resolution, FPS and colors are reduced to fit",
+                  font=("Arial", 8)).grid(row=1, column=2, columnspan=3, sticky=tk.W, padx=(15, 0), pady=(5, 0))
+        ttk.Checkbutton(fps_frame, text="Adaptive FPS (drop still frames)",
+                        variable=self.adaptive_fps).grid(row=1, column=5, columnspan=2, sticky=tk.W,
+                                                         padx=(15, 0), pady=(5, 0))
+        
         time_frame = ttk.LabelFrame(main_frame, text="Time Settings (Optional)", padding="5")
         time_frame.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
         time_frame.columnconfigure(1, weight=1)
@@ -214,10 +225,35 @@ class VideoToGIFConverter:
         button_frame.grid(row=8, column=0, columnspan=3, pady=10)
         
         ttk.Button(button_frame, text="Convert to GIF", command=self.start_conversion).pack(side=tk.LEFT, padx=(0, 10))
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_conversion,
+                                        state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Batch Files...", command=self.browse_batch_files).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Batch Folder...", command=self.browse_batch_folder).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(button_frame, text="Clear All", command=self.clear_all).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(button_frame, text="Exit", command=self.root.quit).pack(side=tk.LEFT)
         
+        preview_frame = ttk.LabelFrame(main_frame, text="Preview", padding="5")
+        preview_frame.grid(row=2, column=3, rowspan=4, sticky=(tk.N, tk.S), padx=(10, 0), pady=10)
+        
+        self.preview_canvas = tk.Canvas(preview_frame, width=PREVIEW_WIDTH, height=PREVIEW_WIDTH * 9 // 16,
+                                        background="black", highlightthickness=0)
+        self.preview_canvas.grid(row=0, column=0)
+        
+        self.preview_strip = tk.Canvas(preview_frame, width=PREVIEW_WIDTH, height=PREVIEW_STRIP_HEIGHT,
+                                       highlightthickness=0)
+        self.preview_strip.grid(row=1, column=0, pady=(5, 0))
+        self.preview_strip.bind("<Button-1>", self.on_preview_strip_click)
+        
+        self.preview_info = ttk.Label(preview_frame, text="No video loaded", font=("Arial", 8), foreground="gray")
+        self.preview_info.grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        
         self.input_video.trace_add('write', self.auto_generate_output)
+        self.input_video.trace_add('write', self.schedule_preview_load)
+        self.start_time.trace_add('write', self.schedule_preview_load)
+        self.stop_time.trace_add('write', self.schedule_preview_load)
+        for var in (self.width, self.height, self.use_crop, self.crop_width, self.crop_height, self.crop_x, self.crop_y):
+            var.trace_add('write', self.redraw_preview)
         
         self.width.trace_add('write', self.on_width_change)
         self.height.trace_add('write', self.on_height_change)
@@ -335,47 +371,128 @@ class VideoToGIFConverter:
 
     def browse_input(self):
         """Browse input path using windows's file dialog"""
-        file_types = [
-            ("Video files", "*.mp4 *.avi *.mov *.mkv *.wmv *.flv *.webm *.m4v"),
-            ("All files", "*.*")
-        ]
-        filename = filedialog.askopenfilename(title="Select Video File", filetypes=file_types)
+        filename = filedialog.askopenfilename(title="Select Video File", filetypes=VIDEO_FILE_TYPES)
         if filename:
             self.input_video.set(filename)
-            width, height, fps = self.get_video_dimensions(filename)
-            fps = ceil(fps)
-            if width and height and fps:
-                self.fps.set(str(fps))
-                self.original_video_width = width
-                self.original_video_height = height
-                if self.lock_aspect.get():
-                    self.original_aspect = width / height
-                self.width.set(str(width))
-                self.height.set(str(height))
-                self.calculate_aspect_ratio()
-                gcd_val = self.gcd(width, height)
-                self.ar_info.config(text=f"Aspect Ratio: Original {width}x{height} - {width//gcd_val}:{height//gcd_val}")
-            else:
-                if self.lock_aspect.get():
-                    self.original_aspect = DEFAULT_ASPECT_RATIO
-                self.calculate_aspect_ratio()
+            self.update_status("Reading video information...")
+            self.bridge.submit(self.bridge.probe_pool, get_video_dimensions, filename,
+                               on_done=lambda info: self.apply_video_info(filename, *info))
+    
+    def apply_video_info(self, filename, width, height, fps):
+        """Fill in size and FPS from a finished probe, unless another file was picked meanwhile"""
+        if self.input_video.get() != filename:
+            return
+        self.status_label.config(text="Ready")
+        fps = ceil(fps) if fps else None
+        if width and height and fps:
+            self.fps.set(str(fps))
+            self.original_video_width = width
+            self.original_video_height = height
+            if self.lock_aspect.get():
+                self.original_aspect = width / height
+            self.width.set(str(width))
+            self.height.set(str(height))
+            self.calculate_aspect_ratio()
+            gcd_val = self.gcd(width, height)
+            self.ar_info.config(text=f"Aspect Ratio: Original {width}x{height} - {width//gcd_val}:{height//gcd_val}")
+        else:
+            if self.lock_aspect.get():
+                self.original_aspect = DEFAULT_ASPECT_RATIO
+            self.calculate_aspect_ratio()
+    
+    def schedule_preview_load(self, *args):
+        """Reload preview frames once typing settles"""
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(PREVIEW_DELAY_MS, self.load_preview)
+    
+    def load_preview(self):
+        """Decode the preview strip in the background"""
+        self.preview_after_id = None
+        self.preview_token += 1
+        token = self.preview_token
+        video = self.input_video.get()
+        if not video:
+            self.show_preview_frames(token, [], None)
+            return
+        
+        try:
+            start = parse_time_to_seconds(self.start_time.get())
+            stop = parse_time_to_seconds(self.stop_time.get())
+        except ValueError:
+            start = stop = None
+        
+        def load():
+            if not os.path.isfile(video):
+                return [], None
+            try:
+                width, height, _ = get_video_dimensions(video)
+                frames = load_strip(video, start, stop)
+            except Exception:
+                width = height = None
+                frames = []
+            return frames, (width, height) if width and height else None
+        
+        self.bridge.submit(self.bridge.thumbnail_pool, load,
+                           on_done=lambda result: self.show_preview_frames(token, *result))
+    
+    def show_preview_frames(self, token, frames, source_size):
+        """Turn decoded PNG frames into images on the Tk thread"""
+        if token != self.preview_token:
+            return
+        self.preview_source_size = source_size
+        self.preview_frames = []
+        for timestamp, png in frames:
+            image = tk.PhotoImage(data=base64.b64encode(png))
+            thumbnail = image.subsample(max(1, ceil(image.width() * len(frames) / PREVIEW_WIDTH)))
+            self.preview_frames.append((timestamp, image, thumbnail))
+        self.preview_index = 0
+        
+        self.preview_strip.delete("all")
+        x = 0
+        for _, _, thumbnail in self.preview_frames:
+            self.preview_strip.create_image(x, 0, image=thumbnail, anchor=tk.NW)
+            x += thumbnail.width()
+        self.redraw_preview()
+    
+    def on_preview_strip_click(self, event):
+        """Show the frame under the cursor in the preview strip"""
+        x = 0
+        for index, (_, _, thumbnail) in enumerate(self.preview_frames):
+            x += thumbnail.width()
+            if event.x < x:
+                self.preview_index = index
+                self.redraw_preview()
+                return
     
-    def get_video_dimensions(self, video_path):
-        """Get video dimensions using ffprobe"""
+    def redraw_preview(self, *args):
+        """Redraw the cached frame with the crop rectangle and output size, without ffmpeg"""
+        canvas = self.preview_canvas
+        canvas.delete("all")
+        if not self.preview_frames:
+            self.preview_info.config(text="No video loaded")
+            return
+        
+        timestamp, image, _ = self.preview_frames[self.preview_index]
+        canvas.config(height=image.height())
+        canvas.create_image(0, 0, image=image, anchor=tk.NW)
+        info = f"{timestamp:.2f}s"
+        
         try:
-            cmd = [
-                FFPROBE_PATH, '-v', 'error', '-select_streams', 'v:0',
-                '-show_entries', 'stream=width,height,avg_frame_rate', '-of', 'csv=p=0',
-                video_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            width, height, fpstemp = result.stdout.strip().split(',')
-            dividend, divisor = fpstemp.split("/")
-            fps = int(dividend) / int(divisor)
-            return int(width), int(height), fps
-        except Exception as e:
-            print(e.with_traceback(None))
-            return None, None, None
+            crop = None
+            if self.use_crop.get():
+                crop = tuple(int(v.get()) for v in (self.crop_width, self.crop_height, self.crop_x, self.crop_y))
+        except ValueError:
+            crop = None
+        if crop and self.preview_source_size:
+            scale = image.width() / self.preview_source_size[0]
+            w, h, x, y = crop
+            canvas.create_rectangle(x * scale, y * scale, (x + w) * scale, (y + h) * scale,
+                                    outline="red", width=2)
+            info += f" | crop {w}x{h}+{x}+{y}"
+        
+        info += f" | output {self.width.get() or '?'}x{self.height.get() or '?'}"
+        self.preview_info.config(text=info)
     
     def toggle_crop_fields(self):
         """Toggle crop function"""
@@ -417,6 +534,11 @@ class VideoToGIFConverter:
         self.crop_x.set("")
         self.crop_y.set("")
         self.use_crop.set(False)
+        self.encoding_mode.set(ENCODING_MODES[0])
+        self.decode_profile.set(PROFILE_NAMES[0])
+        self.shared_palette.set(False)
+        self.adaptive_fps.set(False)
+        self.target_size.set("")
         self.width.set(_width)
         self.height.set(_height)
         self.lock_aspect.set(True)
@@ -425,31 +547,6 @@ class VideoToGIFConverter:
         self.calculate_aspect_ratio()
         self.status_label.config(text="Ready")
     
-    def parse_time_to_seconds(self, time_str):
-        """Parse time in seconds"""
-        if not time_str:
-            return None
-        
-        try:
-            if ':' not in time_str:
-                return float(time_str)
-            
-            parts = time_str.split(':')
-            if len(parts) == 3:  # HH:MM:SS
-                hours, minutes, seconds = parts
-                return float(hours) * 3600 + float(minutes) * 60 + float(seconds)
-            elif len(parts) == 2:  # MM:SS
-                minutes, seconds = parts
-                return float(minutes) * 60 + float(seconds)
-            else:
-                raise ValueError("Invalid time format")
-        except ValueError:
-            raise ValueError(f"Invalid time format: {time_str}")
-    
-    def get_scale_filter(self):
-        """Generate the scale filter with current dimensions"""
-        return f"scale={self.width.get()}:{self.height.get()}:flags=lanczos"
-    
     def validate_inputs(self):
         """Validate user's input"""
         if not self.input_video.get():
@@ -460,132 +557,116 @@ class VideoToGIFConverter:
             messagebox.showerror("Error", "Please specify an output GIF file")
             return False
         
-        if not os.path.exists(self.input_video.get()):
-            messagebox.showerror("Error", "Input video file does not exist")
-            return False
-        
-        try:
-            width = int(self.width.get())
-            height = int(self.height.get())
-            if width <= 0 or height <= 0:
-                messagebox.showerror("Error", "Width and height must be positive integers")
-                return False
-        except ValueError:
-            messagebox.showerror("Error", "Width and height must be valid integers")
-            return False
-        
-        try:
-            fps = int(self.fps.get())
-            if fps <= 0:
-                messagebox.showerror("Error", "FPS must be a positive integer")
-                return False
-        except ValueError:
-            messagebox.showerror("Error", "FPS must be a valid integer")
-            return False
-        
+        # Whether the input exists is checked by the conversion, off the Tk thread
+        return self.validate_settings()
+    
+    def validate_settings(self):
+        """Validate the conversion settings shared by single and batch jobs"""
         try:
-            start_time = self.parse_time_to_seconds(self.start_time.get()) if self.start_time.get() else None
-            stop_time = self.parse_time_to_seconds(self.stop_time.get()) if self.stop_time.get() else None
-            
-            if start_time is not None and stop_time is not None and stop_time <= start_time:
-                messagebox.showerror("Error", "Stop time must be after start time")
-                return False
+            self.get_settings()
+            self.get_target_bytes()
         except ValueError as e:
             messagebox.showerror("Error", str(e))
             return False
-        
-        # Validate crop
-        if self.use_crop.get():
-            try:
-                crop_fields = [self.crop_width.get(), self.crop_height.get(), self.crop_x.get(), self.crop_y.get()]
-                if any(not field for field in crop_fields):
-                    messagebox.showerror("Error", "All crop fields must be filled when crop is enabled")
-                    return False
-                
-                w, h, x, y = map(int, crop_fields)
-                if w <= 0 or h <= 0 or x < 0 or y < 0:
-                    messagebox.showerror("Error", "Crop width and height must be positive, offsets non-negative")
-                    return False
-            except ValueError:
-                messagebox.showerror("Error", "Crop values must be valid integers")
-                return False
-        
         return True
     
-    def create_gif(self):
-        """Create gif from args"""
+    def get_target_bytes(self):
+        """Target GIF size in bytes, or None when no target is set"""
+        if not self.target_size.get().strip():
+            return None
         try:
-            fps = int(self.fps.get())
-            start_time = self.parse_time_to_seconds(self.start_time.get()) if self.start_time.get() else None
-            stop_time = self.parse_time_to_seconds(self.stop_time.get()) if self.stop_time.get() else None
-            
-            crop = None
-            if self.use_crop.get():
-                crop = (
-                    int(self.crop_width.get()),
-                    int(self.crop_height.get()),
-                    int(self.crop_x.get()),
-                    int(self.crop_y.get())
-                )
-            
-            palette_file = "palette.png"
-            
-            video_filters = []
-            
-            if crop:
-                w, h, x, y = crop
-                video_filters.append(f"crop={w}:{h}:{x}:{y}")
-            
-            video_filters.append(self.get_scale_filter())
-            video_filters.append(f"fps={fps}")
-            video_filter_str = ','.join(video_filters)
-            
-            input_options = []
-            if start_time is not None:
-                input_options.extend(['-ss', str(start_time)])
-            if stop_time is not None:
-                input_options.extend(['-to', str(stop_time)])
-            
-            self.update_status("Generating palette...")
-            palette_cmd = [FFMPEG_PATH] + input_options + [
-                '-i', self.input_video.get(),
-                '-vf', f'{video_filter_str},palettegen',
-                '-y', palette_file
-            ]
-            
-            subprocess.run(palette_cmd, check=True, capture_output=True)
-            
-            self.update_status("Creating GIF...")
-            gif_cmd = [FFMPEG_PATH] + input_options + [
-                '-i', self.input_video.get(),
-                '-i', palette_file,
-                '-filter_complex', f'{video_filter_str}[x];[x][1:v]paletteuse',
-                '-loop', '0', '-y', self.output_gif.get()
-            ]
-            
-            subprocess.run(gif_cmd, check=True, capture_output=True)
-            
-            if os.path.exists(palette_file):
-                os.remove(palette_file)
-            
-            self.update_status("Conversion completed successfully!")
-            messagebox.showinfo("Success", f"GIF created successfully!\n{self.output_gif.get()}")
-            
-        except subprocess.CalledProcessError as e:
-            self.update_status("Error: FFmpeg command failed")
-            messagebox.showerror("Error", f"FFmpeg command failed with return code {e.returncode}")
-        except Exception as e:
-            self.update_status(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-        finally:
-            self.progress.stop()
-            self.root.config(cursor="")
+            megabytes = float(self.target_size.get())
+        except ValueError:
+            raise ValueError("Target size must be a number of megabytes")
+        if megabytes <= 0:
+            raise ValueError("Target size must be positive")
+        return int(megabytes * 1024 * 1024)
+    
+    def get_settings(self):
+        """Snapshot the conversion settings from the form"""
+        crop = None
+        if self.use_crop.get():
+            crop = (self.crop_width.get(), self.crop_height.get(), self.crop_x.get(), self.crop_y.get())
+        
+        settings = ConversionSettings.from_form(
+            self.width.get(), self.height.get(), self.fps.get(),
+            self.start_time.get(), self.stop_time.get(), crop, self.encoding_mode.get()
+        )
+        settings.profile = self.decode_profile.get()
+        settings.adaptive_fps = self.adaptive_fps.get()
+        return settings
+    
+    def create_gif(self, settings, input_video, output_gif, target_bytes=None, cancel_token=None):
+        """Convert on the conversion executor, returning the summary shown on success
+
+        Runs off the Tk thread: it reports only through update_status and
+        update_progress, and never touches widgets or Tk variables itself.
+        """
+        if not os.path.exists(input_video):
+            raise ValueError("Input video file does not exist")
+        stages = []
+        on_process = cancel_token.attach if cancel_token else None
+        if target_bytes:
+            used = convert_to_size(settings, input_video, output_gif, target_bytes,
+                                   on_status=self.update_status, on_progress=self.update_progress,
+                                   on_process=on_process, on_stage=stages.append)
+            details = (f"\n{used.width}x{used.height}, {used.fps} FPS, {used.max_colors} colors, "
+                       f"{os.path.getsize(output_gif) / 1024 / 1024:.1f} MB")
+        else:
+            convert(settings, input_video, output_gif,
+                    on_status=self.update_status, on_progress=self.update_progress,
+                    on_process=on_process, on_stage=stages.append)
+            details = ""
+        if stages:
+            details += "\n\n" + format_metrics(stages)
+        return f"GIF created successfully!\n{output_gif}{details}"
+    
+    def conversion_done(self, summary):
+        """Report a finished conversion"""
+        self.finish_conversion()
+        self.status_label.config(text="Conversion completed successfully!")
+        messagebox.showinfo("Success", summary)
+    
+    def conversion_failed(self, error, cancel_token):
+        """Report a failed or cancelled conversion"""
+        self.finish_conversion()
+        if cancel_token.cancelled:
+            self.status_label.config(text="Conversion cancelled")
+        elif isinstance(error, subprocess.CalledProcessError):
+            self.status_label.config(text="Error: FFmpeg command failed")
+            messagebox.showerror("Error", f"FFmpeg command failed with return code {error.returncode}")
+        else:
+            self.status_label.config(text=f"Error: {str(error)}")
+            messagebox.showerror("Error", f"An error occurred: {str(error)}")
+    
+    def finish_conversion(self):
+        """Return the controls to their idle state"""
+        self.reset_progress()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.root.config(cursor="")
+    
+    def update_progress(self, event):
+        """Show a progress event from the conversion thread"""
+        def update():
+            if event.percent is not None:
+                if str(self.progress.cget('mode')) != 'determinate':
+                    self.progress.stop()
+                    self.progress.config(mode='determinate')
+                self.progress['value'] = event.percent
+            self.status_label.config(text=describe_progress(event))
+        self.bridge.post(update)
+    
+    def reset_progress(self):
+        """Return the progress bar to its idle state"""
+        self.progress.stop()
+        self.progress.config(mode='indeterminate')
+        self.progress['value'] = 0
     
     def update_status(self, message):
         """Change the status"""
         def update():
             self.status_label.config(text=message)
-        self.root.after(0, update)
+        self.bridge.post(update)
     
     def start_conversion(self):
         """Start the conversion"""
@@ -596,16 +677,160 @@ class VideoToGIFConverter:
         self.progress.start()
         self.update_status("Starting conversion...")
         
-        thread = threading.Thread(target=self.create_gif)
-        thread.daemon = True
-        thread.start()
+        cancel_token = self.cancel_token = CancelToken()
+        self.cancel_button.config(state=tk.NORMAL)
+        self.bridge.submit(self.bridge.conversion_pool, self.create_gif, self.get_settings(),
+                           self.input_video.get(), self.output_gif.get(), self.get_target_bytes(), cancel_token,
+                           on_done=self.conversion_done,
+                           on_error=lambda error: self.conversion_failed(error, cancel_token))
+    
+    def cancel_conversion(self):
+        """Stop the running conversion; its ffmpeg process group is killed"""
+        if self.cancel_token:
+            self.cancel_token.cancel()
+            self.update_status("Cancelling...")
+
+    def browse_batch_files(self):
+        """Queue several videos with the current settings"""
+        filenames = filedialog.askopenfilenames(title="Select Video Files", filetypes=VIDEO_FILE_TYPES)
+        if filenames:
+            self.queue_batch(filenames)
+    
+    def browse_batch_folder(self):
+        """Queue every video in a folder with the current settings"""
+        directory = filedialog.askdirectory(title="Select Video Folder")
+        if directory:
+            self.queue_batch([directory])
+    
+    def queue_batch(self, paths):
+        """Submit videos to the batch queue"""
+        if not self.validate_settings():
+            return
+        
+        if self.job_queue is None:
+            self.job_queue = JobQueue(self.get_batch_workers(),
+                                      on_update=lambda job: self.bridge.post(self.refresh_job, job))
+        settings = self.get_settings()
+        shared_palette = self.shared_palette.get()
+        
+        # Step that was running, for the error message if one fails
+        stage = ["collecting videos"]
+        
+        def collect_and_submit():
+            # Listing folders and probing for the shared palette can take a while on network shares
+            videos = collect_videos(paths)
+            if not videos:
+                return []
+            batch_settings = settings
+            if shared_palette:
+                stage[0] = "shared palette"
+                palette_file = build_shared_palette(settings, videos, on_status=self.update_status)
+                self.update_status("Shared palette ready")
+                batch_settings = replace(settings, palette=palette_file)
+            stage[0] = "queueing videos"
+            return self.job_queue.submit_many(videos, batch_settings)
+        
+        self.update_status("Collecting videos...")
+        self.bridge.submit(self.bridge.conversion_pool, collect_and_submit,
+                           on_done=self.batch_queued, on_error=lambda error: self.batch_failed(stage[0], error))
+    
+    def batch_queued(self, jobs):
+        """Show the batch window once the jobs are queued"""
+        if not jobs:
+            self.status_label.config(text="Ready")
+            messagebox.showinfo("Batch", "No video files found")
+            return
+        self.status_label.config(text=f"Queued {len(jobs)} videos")
+        self.show_batch_window()
+    
+    def batch_failed(self, stage, error):
+        """Report a batch that could not be queued, naming the step that failed"""
+        self.status_label.config(text=f"Error: {stage} failed: {error}")
+    
+    def get_batch_workers(self):
+        """Read the worker count, falling back to the number of cores"""
+        try:
+            return max(1, int(self.batch_workers.get()))
+        except ValueError:
+            return os.cpu_count() or 1
+    
+    def show_batch_window(self):
+        """Open the batch queue window"""
+        if self.batch_window is not None and self.batch_window.winfo_exists():
+            self.batch_window.lift()
+            return
+        
+        self.batch_window = tk.Toplevel(self.root)
+        self.batch_window.title("Batch Queue")
+        self.batch_window.geometry("640x320")
+        self.batch_window.columnconfigure(0, weight=1)
+        self.batch_window.rowconfigure(0, weight=1)
+        
+        self.batch_tree = ttk.Treeview(self.batch_window, columns=("status", "message"), show="tree headings")
+        self.batch_tree.heading("#0", text="File")
+        self.batch_tree.heading("status", text="Status")
+        self.batch_tree.heading("message", text="Details")
+        self.batch_tree.column("status", width=90, stretch=False)
+        self.batch_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=10, pady=10)
+        
+        controls = ttk.Frame(self.batch_window)
+        controls.grid(row=1, column=0, sticky=(tk.W, tk.E), padx=10, pady=(0, 10))
+        
+        ttk.Label(controls, text="Workers:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Spinbox(controls, from_=1, to=64, textvariable=self.batch_workers, width=5,
+                    command=self.apply_batch_workers).pack(side=tk.LEFT, padx=(0, 15))
+        ttk.Button(controls, text="Cancel", command=self.cancel_selected_jobs).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(controls, text="Retry", command=self.retry_selected_jobs).pack(side=tk.LEFT)
+        
+        if self.job_queue is not None:
+            for job in self.job_queue.jobs:
+                self.refresh_job(job)
+    
+    def apply_batch_workers(self):
+        """Resize the worker pool"""
+        if self.job_queue is not None:
+            self.job_queue.set_workers(self.get_batch_workers())
+    
+    def refresh_job(self, job):
+        """Show a job's state in the batch window"""
+        if self.batch_tree is None or not self.batch_tree.winfo_exists():
+            return
+        iid = str(job.id)
+        message = job.message
+        if job.status == RUNNING and job.progress is not None:
+            message = describe_progress(job.progress)
+        values = (job.status, message)
+        if self.batch_tree.exists(iid):
+            self.batch_tree.item(iid, values=values)
+        else:
+            self.batch_tree.insert("", tk.END, iid=iid, text=os.path.basename(job.input_video), values=values)
+    
+    def selected_jobs(self):
+        """Jobs selected in the batch window"""
+        selected = set(self.batch_tree.selection())
+        return [job for job in self.job_queue.jobs if str(job.id) in selected]
+    
+    def cancel_selected_jobs(self):
+        """Cancel the selected batch jobs"""
+        for job in self.selected_jobs():
+            if job.status in (PENDING, RUNNING):
+                self.job_queue.cancel(job)
+    
+    def retry_selected_jobs(self):
+        """Retry the selected batch jobs"""
+        for job in self.selected_jobs():
+            self.job_queue.retry(job)
 
 def main():
-    setup_binaries()
     root = tk.Tk()
     app = VideoToGIFConverter(root)
-    root.iconbitmap(ICON_PATH)
+    # A cold start extracts the icon from the bundled resources, so set it once that is done
+    app.bridge.submit(app.bridge.probe_pool, get_binary, "icon", on_done=root.iconbitmap)
     root.mainloop()
+    # Executor threads are joined at interpreter exit, so stop their ffmpeg processes first
+    app.bridge.shutdown()
+    shutdown()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,339 @@
+import argparse
+import ctypes
+import ctypes.util
+import json
+import multiprocessing
+import os
+import select
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from cache import user_cache_dir
+from converter import ConversionSettings
+from job_queue import CANCELLED, DONE, FAILED, VIDEO_EXTENSIONS, JobQueue
+
+# Settings file read from each watched folder: the HTTP job fields plus output_dir
+PROFILE_FILE = ".video_to_gif.json"
+WATCH_DIR = "watch"
+RECORD_FILE = "processed.sqlite"
+# A file is queued once its size and mtime have not changed for this many seconds
+SETTLE_SECONDS = 5.0
+POLL_INTERVAL = 5.0
+# How often settling files are checked while events are quiet
+TICK = 1.0
+
+# inotify(7) constants
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+RECORD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    message TEXT,
+    settings TEXT,
+    finished REAL NOT NULL
+);
+"""
+
+def is_video(path):
+    return Path(path).suffix.lower() in VIDEO_EXTENSIONS
+
+def list_videos(folder):
+    """Video files directly inside folder"""
+    try:
+        with os.scandir(folder) as entries:
+            return [entry.path for entry in entries if entry.is_file() and is_video(entry.name)]
+    except OSError:
+        return []
+
+class FolderProfile:
+    """Conversion settings and output directory for one watched folder, reloaded when its file changes"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, PROFILE_FILE)
+        self.mtime_ns = None
+        self.settings, self.output_dir = self.load()
+
+    def load(self):
+        """Settings and output directory from the profile file, raising ValueError if it is invalid"""
+        try:
+            self.mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self.mtime_ns = None
+            return ConversionSettings.from_dict({}), self.folder
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                values = json.load(f)
+            settings = ConversionSettings.from_dict(values)
+            output_dir = os.path.join(self.folder, values.get("output_dir") or "")
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"{self.path}: {e}")
+        return settings, output_dir
+
+    def reload(self):
+        """Re-read the profile if it changed; a broken edit keeps the last good settings"""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns == self.mtime_ns:
+            return
+        try:
+            self.settings, self.output_dir = self.load()
+        except ValueError as e:
+            print(e, file=sys.stderr)
+
+    def output_for(self, video):
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, Path(video).stem + ".gif")
+
+class ProcessedRecord:
+    """Files already converted or failed, kept in SQLite so a restart skips them"""
+
+    def __init__(self, path=None):
+        self.path = path or str(user_cache_dir(WATCH_DIR) / RECORD_FILE)
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(RECORD_SCHEMA)
+            rows = db.execute("SELECT path, size, mtime_ns, status FROM processed").fetchall()
+        self._entries = {path: (size, mtime_ns, status) for path, size, mtime_ns, status in rows}
+        # Failures from earlier runs; --retry-failed gives each of these one more attempt
+        self._retryable = {path for path, (_, _, status) in self._entries.items() if status == FAILED}
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def finished(self, path, identity, retry_failed=False):
+        """Whether this version of the file was already handled
+
+        With retry_failed, a failure recorded before this process started
+        counts as unhandled; one recorded since does not, so a file that
+        keeps failing is tried once per run rather than on every pass.
+        """
+        entry = self._entries.get(path)
+        if entry is None or entry[:2] != identity:
+            return False
+        return not (retry_failed and entry[2] == FAILED and path in self._retryable)
+
+    def mark(self, path, identity, status, output, message, settings):
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO processed (path, size, mtime_ns, status, output, message, settings, finished) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, *identity, status, output, message, json.dumps(asdict(settings)), time.time()),
+            )
+            self._entries[path] = (*identity, status)
+            self._retryable.discard(path)
+
+class InotifySource:
+    """Paths reported by inotify in the watched folders; Linux only"""
+
+    def __init__(self, folders):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}
+        for folder in folders:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"cannot watch {folder}")
+            self.folders[wd] = folder
+
+    def wait(self, timeout):
+        """Paths changed within timeout seconds, or every video when events were lost"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        paths = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return [video for folder in self.folders.values() for video in list_videos(folder)]
+                if wd in self.folders and name:
+                    paths.add(os.path.join(self.folders[wd], os.fsdecode(name)))
+        return [path for path in paths if is_video(path)]
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingSource:
+    """Rescan the watched folders on an interval, e.g. on network shares inotify cannot see"""
+
+    def __init__(self, folders, interval=POLL_INTERVAL):
+        self.folders = folders
+        self.interval = interval
+        self.last_scan = 0.0
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        if time.monotonic() - self.last_scan < self.interval:
+            return []
+        self.last_scan = time.monotonic()
+        return [video for folder in self.folders for video in list_videos(folder)]
+
+    def close(self):
+        pass
+
+class FolderWatcher:
+    """Queue videos that appear in the watched folders once they stop growing
+
+    Detection and settling run on one thread; conversions run on a bounded
+    JobQueue so a slow file never holds up the others.
+    """
+
+    def __init__(self, folders, workers=None, record=None, settle=SETTLE_SECONDS, poll=False,
+                 poll_interval=POLL_INTERVAL, retry_failed=False):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.profiles = {folder: FolderProfile(folder) for folder in self.folders}
+        self.record = record or ProcessedRecord()
+        self.settle = settle
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.retry_failed = retry_failed
+        self.queue = JobQueue(workers, on_update=self._job_updated)
+        # path -> (size, mtime_ns, monotonic time it was last seen changing)
+        self.candidates = {}
+        # job id -> (path, identity) for queued and running jobs
+        self.active = {}
+        # Paths whose job succeeded, to be settled again in case they changed meanwhile
+        self.finished = []
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def open_source(self):
+        if not self.poll and sys.platform.startswith("linux"):
+            try:
+                return InotifySource(self.folders)
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable ({e}), polling instead", file=sys.stderr)
+        return PollingSource(self.folders, self.poll_interval)
+
+    def run(self):
+        """Watch until stop() is called"""
+        source = self.open_source()
+        # Files that arrived while the watcher was down
+        for folder in self.folders:
+            for video in list_videos(folder):
+                self.candidates.setdefault(video, None)
+        try:
+            while not self.stopping.is_set():
+                for path in source.wait(TICK):
+                    self.candidates.setdefault(path, None)
+                self.settle_candidates()
+        finally:
+            source.close()
+
+    def stop(self):
+        self.stopping.set()
+        for job in list(self.queue.jobs):
+            self.queue.cancel(job)
+
+    def settle_candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            busy = {path for path, _ in self.active.values()}
+            for path in self.finished:
+                self.candidates.setdefault(path, None)
+            self.finished.clear()
+        for path, seen in list(self.candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.candidates[path]
+                continue
+            identity = (stat.st_size, stat.st_mtime_ns)
+            if self.record.finished(path, identity, self.retry_failed):
+                del self.candidates[path]
+            elif seen is None or seen[:2] != identity or stat.st_size == 0:
+                self.candidates[path] = (*identity, now)
+            elif path not in busy and now - seen[2] >= self.settle:
+                del self.candidates[path]
+                self.submit(path, identity)
+
+    def submit(self, path, identity):
+        profile = self.profiles[os.path.dirname(path)]
+        profile.reload()
+        with self._lock:
+            job = self.queue.submit(path, profile.output_for(path), profile.settings)
+            self.active[job.id] = (path, identity)
+        print(f"queued {path}")
+
+    def _job_updated(self, job):
+        if job.status not in (DONE, FAILED, CANCELLED):
+            return
+        with self._lock:
+            entry = self.active.pop(job.id, None)
+        if entry is None or job.status == CANCELLED or self.stopping.is_set():
+            return
+        path, identity = entry
+        self.record.mark(path, identity, job.status, job.output_gif, job.message, job.settings)
+        self.queue.remove(job)
+        if job.status != DONE:
+            # A changed file is reported again by the source; retrying an unchanged one would only fail again
+            print(f"{path}: {job.message}", file=sys.stderr)
+            return
+        print(f"{path} -> {job.output_gif}")
+        with self._lock:
+            self.finished.append(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert videos as they arrive in watched folders")
+    parser.add_argument("folders", nargs="+",
+                        help=f"folders to watch; each may hold a {PROFILE_FILE} with its settings")
+    parser.add_argument("-j", "--workers", type=int, help="concurrent conversions (default: CPU count)")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="seconds a file must stay unchanged before it is converted")
+    parser.add_argument("--poll", action="store_true", help="rescan instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--record", help="processed-file database (default: the user cache)")
+    parser.add_argument("--retry-failed", action="store_true", help="try files that failed in earlier runs once more")
+    args = parser.parse_args(argv)
+
+    missing = [folder for folder in args.folders if not os.path.isdir(folder)]
+    if missing:
+        print(f"error: not a directory: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    try:
+        watcher = FolderWatcher(args.folders, args.workers, ProcessedRecord(args.record), args.settle, args.poll,
+                                args.poll_interval, args.retry_failed)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(f"Watching {len(watcher.folders)} folders with {watcher.queue.workers} workers")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+
+from supervisor import kill_all
+
+# Directory for job workspaces; overrides the RAM-backed and system defaults
+WORKSPACE_ENV = "VIDEO_TO_GIF_TMPDIR"
+# RAM-backed locations tried before the system temp directory
+RAM_DIRS = ("/dev/shm",)
+# Free space a RAM directory must keep beyond what the job expects to write
+RAM_HEADROOM = 256 * 1024 * 1024
+WORKSPACE_PREFIX = "video_to_gif_"
+PARTIAL_SUFFIX = ".part.gif"
+
+_active = set()
+_active_lock = threading.Lock()
+
+def workspace_root(expected_bytes=0):
+    """Where job workspaces go: a RAM-backed directory with room for expected_bytes, else the temp dir"""
+    override = os.environ.get(WORKSPACE_ENV)
+    if override:
+        return override
+    for directory in RAM_DIRS:
+        try:
+            if os.access(directory, os.W_OK) and \
+                    shutil.disk_usage(directory).free >= expected_bytes + RAM_HEADROOM:
+                return directory
+        except OSError:
+            continue
+    return tempfile.gettempdir()
+
+def _track(path):
+    with _active_lock:
+        _active.add(path)
+
+def _untrack(path):
+    with _active_lock:
+        _active.discard(path)
+
+def remove_path(path):
+    """Delete a file or directory tree, ignoring anything already gone"""
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.unlink(path)
+    except OSError:
+        pass
+
+class Workspace:
+    """Private temp directory for one job's intermediates, removed when the job ends"""
+
+    def __init__(self, prefix="job_", expected_bytes=0):
+        self.path = tempfile.mkdtemp(prefix=WORKSPACE_PREFIX + prefix, dir=workspace_root(expected_bytes))
+        _track(self.path)
+
+    def file(self, name):
+        """Path for an intermediate file inside the workspace"""
+        return os.path.join(self.path, name)
+
+    def cleanup(self):
+        remove_path(self.path)
+        _untrack(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+def create_partial(directory, prefix, suffix=PARTIAL_SUFFIX):
+    """Create an empty, uniquely named file in directory and return its path
+
+    Unlike mkstemp, which always uses mode 0600, the file gets the usual
+    permissions from the umask, and os.replace carries them over to the output.
+    """
+    while True:
+        path = os.path.join(directory, f"{prefix}{uuid.uuid4().hex[:12]}{suffix}")
+        try:
+            with open(path, "xb"):
+                return path
+        except FileExistsError:
+            continue
+
+@contextmanager
+def atomic_output(output_path):
+    """Yield a temporary path beside output_path that replaces it only if the block completes
+
+    The temporary file is in the output's directory so the final rename stays on one filesystem.
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    partial = create_partial(directory, f".{os.path.basename(output_path)}.")
+    _track(partial)
+    try:
+        yield partial
+        os.replace(partial, output_path)
+    finally:
+        remove_path(partial)
+        _untrack(partial)
+
+def cleanup_workspaces():
+    """Remove every workspace and partial output that is still in use"""
+    with _active_lock:
+        paths = list(_active)
+        _active.clear()
+    for path in paths:
+        remove_path(path)
+
+def _cleanup_at_exit():
+    # Processes go first so nothing is still writing into a workspace being removed
+    kill_all()
+    cleanup_workspaces()
+
+atexit.register(_cleanup_at_exit)